@@ -2,9 +2,31 @@
 import anthropic
 import yaml
 import ast
+import os
+import re
+import stat
+import tempfile
+import threading
+from functools import lru_cache
 from pathlib import Path
-from templates import TEMPLATES
+from typing import Optional
+from tracing import traced
+from replay import replay_message, record_message
+from templates import TEMPLATES, REGISTER_CONSTANTS_SECTION, REGISTER_INLINE_CONSTANTS
 
+# Shared module that register tests import their address/mask constants from
+CONSTANTS_MODULE = "register_constants"
+
+MODEL = "claude-sonnet-4-20250514"
+MAX_TOKENS = 4096
+
+# USD per million (input, output) tokens, for usage reports
+PRICE_PER_MTOK = {
+    "claude-sonnet-4-20250514": (3.00, 15.00),
+    "claude-3-5-haiku-20241022": (0.80, 4.00),
+}
+
+@traced("stage.load_spec")
 def load_spec(spec_path: str) -> tuple[str, str]:
     """
     Load a spec file and return (content, detected_type).
@@ -33,27 +55,216 @@ def load_spec(spec_path: str) -> tuple[str, str]:
         # Plain text file (.txt, .spec, etc.)
         return content, "generic"
 
-def generate_tests(spec: str, template_type: str = "generic") -> str:
+def field_bits(bits: list) -> tuple[int, int]:
+    """Return (msb, lsb) for a field's `bits` entry ([bit] or [msb, lsb])."""
+    msb, lsb = (bits[0], bits[0]) if len(bits) == 1 else (bits[0], bits[1])
+    return max(msb, lsb), min(msb, lsb)
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def build_register_constants(spec: str) -> Optional[tuple[str, str]]:
     """
-    Generate tests using the appropriate template.
+    Compute the address/mask constants for a register spec deterministically.
     
-    Args:
-        spec: The specification as a string
-        template_type: One of "generic", "register", "interface"
+    Field constants are prefixed with the register name so several registers
+    can share one constants module without collisions. Every register test
+    in a directory imports that module, so a spec that would produce an
+    invalid or duplicate name is left to inline constants instead.
+    
+    Returns:
+        tuple: (register name, constants as Python source), or None if the
+        spec is not a structured register spec or its constants can't be
+        named safely
+    """
+    try:
+        parsed = yaml.safe_load(spec)
+    except yaml.YAMLError:
+        return None
+    if not isinstance(parsed, dict) or not isinstance(parsed.get("register"), dict):
+        return None
+    
+    register = parsed["register"]
+    width = register.get("width", 32)
+    if "name" not in register or not _is_int(register.get("address")) or not _is_int(width):
+        return None
+    name = str(register["name"]).upper()
+    # (constant, value) pairs; None marks a blank line between fields
+    entries = [(f"{name}_ADDR", f"0x{register['address']:X}"), (f"{name}_WIDTH", width)]
+    if "reset_value" in register:
+        if not _is_int(register["reset_value"]):
+            return None
+        entries.append((f"{name}_RESET_VALUE", f"0x{register['reset_value']:0{width // 4}X}"))
+    
+    fields = register.get("fields") or []
+    if not isinstance(fields, list):
+        return None
+    for field in fields:
+        if not isinstance(field, dict) or "name" not in field:
+            return None
+        bits, values = field.get("bits"), field.get("values") or {}
+        if (not isinstance(bits, list) or len(bits) not in (1, 2)
+                or not all(_is_int(bit) and bit >= 0 for bit in bits)
+                or not isinstance(values, dict) or not all(_is_int(value) for value in values)):
+            return None
+        prefix = f"{name}_{str(field['name']).upper()}"
+        msb, lsb = field_bits(bits)
+        mask = ((1 << (msb - lsb + 1)) - 1) << lsb
+        entries += [None, (f"{prefix}_MASK", f"0x{mask:X}"), (f"{prefix}_POS", lsb)]
+        entries += [(f"{prefix}_{str(label).upper()}", value) for value, label in values.items()]
+    
+    # Labels like "LOW POWER" or "MASK" would break or shadow shared constants
+    names = [entry[0] for entry in entries if entry]
+    if len(set(names)) != len(names) or not all(key.isidentifier() for key in names):
+        return None
+    lines = [f"{entry[0]} = {entry[1]}" if entry else "" for entry in entries]
+    return name, "\n".join(lines) + "\n"
+
+_constants_lock = threading.Lock()
+
+def update_constants_module(name: str, constants: str, module_path: str) -> None:
+    """
+    Write one register's constants into the shared constants module.
+    
+    Each register owns a delimited section; re-running for the same register
+    replaces its section and leaves the others untouched.
+    """
+    path = Path(module_path)
+    # Read-modify-write of a shared file: concurrent workers (e.g. watch mode)
+    # would otherwise drop each other's sections
+    with _constants_lock:
+        sections = {}
+        if path.exists():
+            for match in re.finditer(r"# --- BEGIN (\S+) ---\n(.*?)# --- END \1 ---\n",
+                                     path.read_text(), re.DOTALL):
+                sections[match.group(1)] = match.group(2)
+        sections[name] = constants
+        
+        body = "".join(f"# --- BEGIN {key} ---\n{sections[key]}# --- END {key} ---\n\n"
+                       for key in sorted(sections))
+        header = ('"""Register constants computed from specs by Generate_Tests. '
+                  'Do not edit."""\n\n')
+        save_tests(header + body.rstrip("\n") + "\n", str(path))
+
+def constants_path(output_path: str) -> Path:
+    """Path of the shared constants module for a test file."""
+    return Path(output_path).parent / f"{CONSTANTS_MODULE}.py"
+
+def save_register_constants(spec: str, output_path: str) -> Optional[tuple[str, str]]:
+    """
+    Write a register spec's constants into the shared module next to a test file.
+    
+    Returns:
+        tuple: (register name, constants as Python source), or None if the
+        spec has no precomputed constants and nothing was written
+    """
+    constants = build_register_constants(spec)
+    if constants is not None:
+        name, source = constants
+        update_constants_module(name, source, str(constants_path(output_path)))
+    return constants
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting and reporting (~4 characters per token)."""
+    return (len(text) + 3) // 4
+
+def constants_section(specs: list[str]) -> str:
+    """
+    Render the prompt section listing the shared constants for register specs.
+    
+    Falls back to asking the model to define its own constants if any spec
+    is not a structured register spec.
+    """
+    built = [build_register_constants(spec) for spec in specs]
+    if not built or any(entry is None for entry in built):
+        return REGISTER_INLINE_CONSTANTS
+    return REGISTER_CONSTANTS_SECTION.format(
+        module=CONSTANTS_MODULE, constants="\n".join(source for _, source in built))
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    """Estimated USD cost of a request; 0.0 for models without a known price."""
+    input_price, output_price = PRICE_PER_MTOK.get(model, (0.0, 0.0))
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+def render_prompt(spec: str, template_type: str = "generic",
+                  shared_constants: bool = False) -> str:
+    """
+    Render the prompt for a spec.
+    
+    With shared_constants, a register spec's constants are precomputed and
+    the tests import them from the shared constants module, which
+    save_tests(..., spec=spec) writes next to the test file. Otherwise the
+    model defines its own constants, so the tests are self-contained.
     """
     if template_type not in TEMPLATES:
         raise ValueError(f"Unknown template type: {template_type}. "
                         f"Available: {list(TEMPLATES.keys())}")
     
+    if template_type == "register" and shared_constants:
+        section = constants_section([spec])
+    else:
+        section = REGISTER_INLINE_CONSTANTS
     template = TEMPLATES[template_type]
-    prompt = template.format(spec=spec)
+    return template.format(spec=spec, constants_section=section)
+
+@lru_cache(maxsize=1)
+def get_client() -> "anthropic.Anthropic":
+    """Shared API client, created once so connections stay warm."""
+    return anthropic.Anthropic()
+
+def _count_message_tokens(text: str, model: str) -> int:
+    return get_client().messages.count_tokens(
+        model=model,
+        messages=[{"role": "user", "content": text}]
+    ).input_tokens
+
+@lru_cache(maxsize=None)
+def _message_overhead(model: str) -> int:
+    """Tokens the API counts for a one-token message beyond that token."""
+    return _count_message_tokens(".", model) - 1
+
+def count_tokens(text: str, model: str = MODEL) -> int:
+    """
+    Count text's tokens with the API's tokenizer (messages.count_tokens).
+    
+    The per-message framing is measured once per model and subtracted. Raises
+    the client's error when the API can't be reached.
+    """
+    return _count_message_tokens(text, model) - _message_overhead(model)
+
+@traced("stage.api")
+def create_message(prompt: str, max_tokens: int = MAX_TOKENS, model: str = MODEL):
+    """
+    Send a rendered prompt to the API and return the raw message.
     
-    client = anthropic.Anthropic()
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=4096,
+    In replay mode the recorded response is returned without contacting the
+    API; in record mode the live response is also stored.
+    """
+    replayed = replay_message(prompt, model, max_tokens)
+    if replayed is not None:
+        return replayed
+    message = get_client().messages.create(
+        model=model,
+        max_tokens=max_tokens,
         messages=[{"role": "user", "content": prompt}]
     )
+    record_message(prompt, model, max_tokens, message)
+    return message
+
+def generate_tests(spec: str, template_type: str = "generic",
+                   shared_constants: bool = False) -> str:
+    """
+    Generate tests using the appropriate template.
+    
+    Args:
+        spec: The specification as a string
+        template_type: One of "generic", "register", "interface"
+        shared_constants: Import register constants from the shared module
+            instead of defining them in the tests (see render_prompt); save
+            the result with save_tests(..., spec=spec)
+    """
+    prompt = render_prompt(spec, template_type, shared_constants)
+    message = create_message(prompt)
     return message.content[0].text
 
 def generate_from_string(spec_text: str, template_type: str = "generic") -> str:
@@ -63,6 +274,7 @@ def generate_from_string(spec_text: str, template_type: str = "generic") -> str:
     """
     return generate_tests(spec_text, template_type)
 
+@traced("stage.validate_syntax")
 def validate_syntax(code: str) -> tuple[bool, str]:
     """Check if generated code is valid Python."""
     code = code.strip()
@@ -80,11 +292,116 @@ def validate_syntax(code: str) -> tuple[bool, str]:
     except SyntaxError as e:
         return False, str(e)
 
-def save_tests(code: str, output_path: str) -> None:
-    """Save generated tests to file."""
-    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-    with open(output_path, "w") as f:
-        f.write(code)
+def _unchanged(path: Path, data: bytes) -> bool:
+    """True if path already holds exactly data."""
+    try:
+        return path.stat().st_size == len(data) and path.read_bytes() == data
+    except FileNotFoundError:
+        return False
+
+# Read once at import: os.umask() can only be queried by setting it, which
+# is not safe while other threads create files
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def _file_mode(path: Path) -> int:
+    """Mode for a new or replaced file: keep the target's, else 0o666 & ~umask."""
+    try:
+        return stat.S_IMODE(path.stat().st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+def stage_file(path: Path, data: bytes) -> str:
+    """
+    Write data to a temp file next to path and return the temp file's name.
+    
+    The temp file gets the mode the target should end up with, since
+    os.replace() keeps the temp file's (private) mode.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, _file_mode(path))
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return tmp
+
+@traced("stage.save_tests")
+def save_tests(code: str, output_path: str, spec: Optional[str] = None) -> bool:
+    """
+    Save generated tests to file atomically (temp file + rename).
+    
+    The write is skipped when the file already has this exact content, so
+    mtimes only change when the tests do.
+    
+    Args:
+        code: The test module source
+        output_path: Where to write it
+        spec: The spec the tests were generated from; a register spec's
+            constants are written to the shared module next to the file first
+    
+    Returns:
+        bool: True if the test file was written
+    """
+    if spec is not None:
+        save_register_constants(spec, output_path)
+    path = Path(output_path)
+    data = code.encode()
+    if _unchanged(path, data):
+        return False
+    os.replace(stage_file(path, data), path)
+    return True
+
+class BatchWriter:
+    """
+    Commit a batch of outputs together.
+    
+    Outputs are collected with add(); commit() stages every changed file to a
+    temp file first and only then renames them all into place, so a failure
+    while writing leaves every target untouched. Used as a context manager,
+    the batch commits on success and is discarded on an exception. The paths
+    written by the last commit are kept in `written`.
+    """
+    
+    def __init__(self):
+        self._outputs = {}
+        self.written = []
+    
+    def add(self, code: str, output_path: str) -> None:
+        """Queue an output; a later add() for the same path replaces it."""
+        self._outputs[str(output_path)] = code
+    
+    def commit(self) -> list[str]:
+        """Write all changed outputs; returns the paths that were written."""
+        staged = []
+        try:
+            for output_path, code in self._outputs.items():
+                path, data = Path(output_path), code.encode()
+                if not _unchanged(path, data):
+                    staged.append((stage_file(path, data), path))
+        except BaseException:
+            for tmp, _ in staged:
+                os.unlink(tmp)
+            raise
+        for tmp, path in staged:
+            os.replace(tmp, path)
+        self._outputs.clear()
+        self.written = [str(path) for _, path in staged]
+        return self.written
+    
+    def __enter__(self) -> "BatchWriter":
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self._outputs.clear()
 
 if __name__ == "__main__":
     # Example 1: Generic function spec (original use case)
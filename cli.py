@@ -1,16 +1,191 @@
 # cli.py
 import argparse
 import sys
+from functools import partial
+from pathlib import Path
 from Generate_Tests import (
     load_spec, 
     generate_tests, 
     generate_from_string,
     validate_syntax, 
-    save_tests
+    save_tests,
+    build_register_constants,
+    constants_path,
+    count_tokens,
+    estimate_tokens
 )
 from templates import TEMPLATES
+from packing import plan_packs, generate_packed, DEFAULT_PACK_BUDGET
+from splice import update_tests, save_snapshot
+from server import serve, remote_generate, DEFAULT_ADDRESS
+from watch import SpecWatcher
+from hedging import generate_hedged
+from routing import generate_routed, load_policy
+from pipeline import run_pipeline
+from tracing import span, tracing, profiling
+from replay import recording, replaying, is_replaying
+
+def default_output_path(spec_file: str) -> str:
+    """Derive generated_tests/test_<name>.py from a spec file path."""
+    spec_name = spec_file.split("/")[-1].replace(".yaml", "").replace(".txt", "")
+    return f"generated_tests/test_{spec_name}.py"
+
+def report_register_constants(spec_content: str, output_path: str,
+                              report_savings: bool = False) -> None:
+    """
+    Report the shared constants a register test file imports.
+    
+    Args:
+        spec_content: The register spec
+        output_path: Path of the test file that imports the constants
+        report_savings: Print the output tokens the model didn't have to
+            write, measured with the API's token counter (an estimate at ~4
+            characters per token if it can't be reached); only meaningful
+            after a live generation
+    """
+    constants = build_register_constants(spec_content)
+    if constants is None:
+        return
+    name, source = constants
+    savings = ""
+    if report_savings:
+        try:
+            savings = f" ({count_tokens(source)} output tokens saved)"
+        except Exception:
+            savings = f" (est. ~{estimate_tokens(source)} output tokens saved)"
+    print(f"Constants: {constants_path(output_path)} [{name}]{savings}", file=sys.stderr)
+
+def save_outputs(code: str, spec_content: str, template_type: str,
+                 output_path: str, snapshot: bool = True) -> bool:
+    """
+    Save a test file with its spec snapshot and any register constants.
+    
+    Returns:
+        bool: True if the test file changed
+    """
+    changed = save_tests(code, output_path, spec=spec_content)
+    if snapshot:
+        save_snapshot(spec_content, output_path)
+    if template_type == "register":
+        report_register_constants(spec_content, output_path,
+                                  report_savings=changed and not is_replaying())
+    return changed
+
+def run_watch(dirs: list[str], template: str, server: str) -> None:
+    """Regenerate tests whenever a spec's normalized content changes."""
+    def regenerate(spec_path, spec_content, detected_type, is_current):
+        with span("spec", path=spec_path):
+            template_type = template or detected_type
+            output_path = default_output_path(spec_path)
+            print(f"Changed: {spec_path}", file=sys.stderr)
+            if server:
+                code = remote_generate(server, spec_content, template_type, shared_constants=True)
+            else:
+                code = generate_tests(spec_content, template_type, shared_constants=True)
+            if not is_current():
+                print(f"Stale: {spec_path} (superseded by a newer save)", file=sys.stderr)
+                return False
+            is_valid, result = validate_syntax(code)
+            if not is_valid:
+                print(f"Syntax error in {output_path}: {result}", file=sys.stderr)
+                return False
+            changed = save_outputs(result, spec_content, template_type, output_path)
+            print(f"{'Generated' if changed else 'Unchanged'}: {output_path}", file=sys.stderr)
+            return True
+    
+    print(f"Watching: {', '.join(dirs)}", file=sys.stderr)
+    try:
+        SpecWatcher(dirs, regenerate).run()
+    except KeyboardInterrupt:
+        pass
+
+def run_generate_then_run(spec_files: list[str], template: str, workers: int) -> int:
+    """Generate specs and run each suite against the simulators as it arrives."""
+    jobs = []
+    for spec_file in spec_files:
+        spec_content, detected_type = load_spec(spec_file)
+        jobs.append({"spec": spec_content, "template_type": template or detected_type,
+                     "output_path": default_output_path(spec_file)})
+    
+    def save(code, job):
+        save_outputs(code, job["spec"], job["template_type"], job["output_path"])
+    
+    failures = 0
+    generate = partial(generate_tests, shared_constants=True)
+    for result in run_pipeline(jobs, save=save, generate=generate, run_workers=workers):
+        output_path = result["job"]["output_path"]
+        if result["stage"] == "generate":
+            if result["valid"]:
+                print(f"Generated: {output_path}", file=sys.stderr)
+            else:
+                failures += 1
+                print(f"Syntax error in {output_path}: {result['error']}", file=sys.stderr)
+            continue
+        status = "PASS" if result["passed"] else "FAIL"
+        target = "simulator" if result["simulated"] else "no simulator"
+        print(f"{status}: {output_path} ({target}) {result['summary']}", file=sys.stderr)
+        if not result["passed"]:
+            failures += 1
+    return 1 if failures else 0
+
+def run_packed(spec_files: list[str], template: str, budget: int) -> int:
+    """Generate tests for many spec files, packing small ones together."""
+    jobs = []
+    for spec_file in spec_files:
+        spec_content, detected_type = load_spec(spec_file)
+        output_path = default_output_path(spec_file)
+        jobs.append({
+            "id": output_path.split("/")[-1].replace(".py", ""),
+            "spec": spec_content,
+            "template_type": template or detected_type,
+            "output_path": output_path,
+        })
+    
+    failures = 0
+    packs = plan_packs(jobs, budget)
+    print(f"Packed {len(jobs)} specs into {len(packs)} requests", file=sys.stderr)
+    for pack in packs:
+        for result in generate_packed(pack):
+            job = result["job"]
+            if not result["ok"]:
+                failures += 1
+                print(f"Syntax error in {job['output_path']}: {result['error']}", file=sys.stderr)
+                continue
+            save_snapshot(job["spec"], job["output_path"])
+            if job["template_type"] == "register":
+                report_register_constants(job["spec"], job["output_path"],
+                                          report_savings=result["changed"] and not is_replaying())
+            mode = "packed" if result["packed"] else "individual"
+            status = "Generated" if result["changed"] else "Unchanged"
+            print(f"{status}: {job['output_path']} ({mode})", file=sys.stderr)
+    return 1 if failures else 0
+
+def serve_main(argv: list[str]) -> None:
+    """`cli.py serve`: run the shared generation service."""
+    parser = argparse.ArgumentParser(
+        prog="cli.py serve",
+        description="Serve test generation with a warm client, cache and "
+                    "coalescing of identical in-flight requests"
+    )
+    parser.add_argument("address", nargs="?", default=DEFAULT_ADDRESS,
+                        help=f"http://host:port or unix:/path (default: {DEFAULT_ADDRESS})")
+    archive_group = parser.add_mutually_exclusive_group()
+    archive_group.add_argument("--record", metavar="ARCHIVE",
+                               help="Store every API request/response in ARCHIVE "
+                                    "(written when the server stops)")
+    archive_group.add_argument("--replay", metavar="ARCHIVE",
+                               help="Serve responses from ARCHIVE without "
+                                    "contacting the API")
+    args = parser.parse_args(argv)
+    print(f"Serving on {args.address}", file=sys.stderr)
+    with recording(args.record), replaying(args.replay):
+        serve(args.address)
 
 def main():
+    if sys.argv[1:2] == ["serve"]:
+        serve_main(sys.argv[2:])
+        return
+    
     parser = argparse.ArgumentParser(
         description="Generate hardware validation tests from specs"
     )
@@ -20,6 +195,15 @@ def main():
     input_group.add_argument("spec_file", nargs="?", help="Path to spec file")
     input_group.add_argument("-s", "--spec", dest="inline_spec",
                              help="Inline specification string")
+    input_group.add_argument("--pack", nargs="+", metavar="SPEC_FILE",
+                             help="Generate several spec files, packing small "
+                                  "specs of the same template into one request")
+    input_group.add_argument("--run", nargs="+", metavar="SPEC_FILE",
+                             help="Generate spec files and run each suite against "
+                                  "local simulators as soon as it arrives")
+    input_group.add_argument("--watch", nargs="*", metavar="DIR",
+                             help="Watch spec directories (default: specs) and "
+                                  "regenerate specs whose content changed")
     
     parser.add_argument("-t", "--template", 
                         choices=list(TEMPLATES.keys()),
@@ -29,9 +213,73 @@ def main():
                         help="Print to stdout instead of file")
     parser.add_argument("--no-validate", action="store_true",
                         help="Skip syntax validation")
+    parser.add_argument("--pack-budget", type=int, default=DEFAULT_PACK_BUDGET,
+                        help="Max estimated spec tokens per packed request")
+    parser.add_argument("--server", metavar="ADDRESS",
+                        help="Generate through a running `cli.py serve` "
+                             "(http://host:port or unix:/path)")
+    parser.add_argument("--hedge", type=int, default=1, metavar="N",
+                        help="Race up to N candidate requests and keep the "
+                             "first that passes validation")
+    parser.add_argument("--hedge-delay", type=float, default=0.0, metavar="SECONDS",
+                        help="Delay before launching each extra hedged "
+                             "candidate (default: launch all at once)")
+    parser.add_argument("--route", action="store_true",
+                        help="Pick model and max_tokens from spec complexity "
+                             "and log the outcome for policy tuning")
+    parser.add_argument("--routing-policy", metavar="FILE",
+                        help="YAML/JSON routing policy table (implies --route)")
+    parser.add_argument("--jobs", type=int, default=2,
+                        help="Concurrent test processes for --run")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="Write a Chrome/Perfetto trace of the run to FILE")
+    parser.add_argument("--profile", nargs="?", const="generate_tests", metavar="PREFIX",
+                        help="Capture cProfile and tracemalloc snapshots to "
+                             "PREFIX.prof / PREFIX.*.tracemalloc")
+    archive_group = parser.add_mutually_exclusive_group()
+    archive_group.add_argument("--record", metavar="ARCHIVE",
+                               help="Store every API request/response in ARCHIVE")
+    archive_group.add_argument("--replay", metavar="ARCHIVE",
+                               help="Serve responses from ARCHIVE without "
+                                    "contacting the API")
+    parser.add_argument("--update", action="store_true",
+                        help="Regenerate only tests affected by spec changes "
+                             "since the last run, keeping the rest of the file")
     
     args = parser.parse_args()
+    # Batch modes write every spec to its default path with the plain generator
+    single_spec_options = {
+        "-o/--output": args.output, "--stdout": args.stdout,
+        "--no-validate": args.no_validate, "--server": args.server,
+        "--hedge": args.hedge > 1, "--route": args.route,
+        "--routing-policy": args.routing_policy, "--update": args.update,
+    }
+    for mode, selected, supported in (("--pack", args.pack, ()), ("--run", args.run, ()),
+                                      ("--watch", args.watch is not None, ("--server",))):
+        ignored = [flag for flag, used in single_spec_options.items()
+                   if used and flag not in supported]
+        if selected and ignored:
+            parser.error(f"{mode} cannot be combined with {', '.join(ignored)}")
     
+    with tracing(args.trace), profiling(args.profile), \
+         recording(args.record), replaying(args.replay):
+        run(args)
+
+def run(args: argparse.Namespace) -> None:
+    """Dispatch a parsed command line to the selected mode."""
+    if args.pack:
+        sys.exit(run_packed(args.pack, args.template, args.pack_budget))
+    if args.run:
+        sys.exit(run_generate_then_run(args.run, args.template, args.jobs))
+    if args.watch is not None:
+        run_watch(args.watch or ["specs"], args.template, args.server)
+        return
+    
+    with span("spec", path=args.spec_file or "<inline>"):
+        generate_one(args)
+
+def generate_one(args: argparse.Namespace) -> None:
+    """Generate tests for a single spec file or inline spec."""
     # Get spec content and determine template type
     if args.inline_spec:
         spec_content = args.inline_spec
@@ -42,8 +290,41 @@ def main():
     
     print(f"Using template: {template_type}", file=sys.stderr)
     
-    # Generate tests
-    code = generate_tests(spec_content, template_type)
+    # Splice in tests for changed fields/operations only, if possible
+    if args.update and args.spec_file and not args.stdout:
+        output_path = args.output or default_output_path(args.spec_file)
+        status, code = update_tests(spec_content, template_type, output_path,
+                                    shared_constants=True)
+        if status != "full":
+            if status == "spliced":
+                save_outputs(code, spec_content, template_type, output_path)
+            print(f"Updated: {output_path} ({status})", file=sys.stderr)
+            return
+        print("Spec changed beyond fields/operations, regenerating", file=sys.stderr)
+    
+    # Generate tests; register tests printed to stdout define their own
+    # constants, since no shared constants module is written next to them
+    shared = not args.stdout
+    if args.server:
+        code = remote_generate(args.server, spec_content, template_type, shared_constants=shared)
+    elif args.hedge > 1:
+        report = generate_hedged(spec_content, template_type, args.hedge, args.hedge_delay,
+                                 shared_constants=shared)
+        print(f"Hedged: {report['launched']} launched, {report['completed']} completed, "
+              f"{report['abandoned']} abandoned in {report['latency']:.1f}s; "
+              f"{report['input_tokens']} in / {report['output_tokens']} out tokens "
+              f"(~${report['cost']:.4f})", file=sys.stderr)
+        code = report["code"]
+    elif args.route or args.routing_policy:
+        policy = load_policy(args.routing_policy) if args.routing_policy else None
+        code, outcome = generate_routed(spec_content, template_type, policy,
+                                        shared_constants=shared)
+        print(f"Routed: {outcome['tier']} tier (score {outcome['complexity']['score']}) -> "
+              f"{outcome['model']}, max_tokens={outcome['max_tokens']}; "
+              f"{outcome['latency']:.1f}s, {outcome['output_tokens']} out tokens"
+              f"{', truncated' if outcome['truncated'] else ''}", file=sys.stderr)
+    else:
+        code = generate_tests(spec_content, template_type, shared_constants=shared)
     
     # Validate syntax
     if not args.no_validate:
@@ -60,13 +341,13 @@ def main():
         if args.output:
             output_path = args.output
         elif args.spec_file:
-            spec_name = args.spec_file.split("/")[-1].replace(".yaml", "").replace(".txt", "")
-            output_path = f"generated_tests/test_{spec_name}.py"
+            output_path = default_output_path(args.spec_file)
         else:
             output_path = "generated_tests/test_output.py"
         
-        save_tests(code, output_path)
-        print(f"Generated: {output_path}", file=sys.stderr)
+        changed = save_outputs(code, spec_content, template_type, output_path,
+                               snapshot=bool(args.spec_file))
+        print(f"{'Generated' if changed else 'Unchanged'}: {output_path}", file=sys.stderr)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
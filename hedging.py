@@ -0,0 +1,113 @@
+# hedging.py
+"""
+Hedged generation: race several candidate requests for the same spec.
+
+The first candidate is sent immediately. Additional candidates are launched
+after a configurable delay (or all at once with a delay of 0), and a
+candidate that fails validation is replaced right away. The first completion
+that passes validate_syntax wins.
+
+Candidates run on daemon threads, so the caller returns as soon as a winner
+arrives and the process can exit without joining the losers. Losing
+requests are abandoned, not cancelled: they keep running in the background
+until they finish or the process exits, and may still be billed.
+"""
+import queue
+import threading
+import time
+from Generate_Tests import render_prompt, create_message, validate_syntax, estimate_cost, MODEL
+
+def generate_hedged(spec: str, template_type: str = "generic",
+                    candidates: int = 2, delay: float = 0.0,
+                    shared_constants: bool = False) -> dict:
+    """
+    Generate tests, returning the first candidate that passes validation.
+    
+    Args:
+        spec: The specification as a string
+        template_type: One of "generic", "register", "interface"
+        candidates: Maximum number of requests to launch
+        delay: Seconds between launching successive candidates (0 = all at once)
+        shared_constants: Import register constants from the shared module
+            (see Generate_Tests.render_prompt)
+    
+    Returns:
+        dict: "valid", "code" (validated code, or the last invalid completion),
+        "error", "launched", "completed", "abandoned", "input_tokens",
+        "output_tokens", "cost" and "latency". Token counts and cost cover
+        completed candidates only; abandoned ones may still be billed.
+    """
+    prompt = render_prompt(spec, template_type, shared_constants)
+    start = time.monotonic()
+    results = queue.Queue()
+    report = {"valid": False, "code": None, "error": None, "launched": 0, "completed": 0,
+              "abandoned": 0, "input_tokens": 0, "output_tokens": 0, "cost": 0.0}
+    last_launch = start
+    
+    def call() -> None:
+        try:
+            results.put((create_message(prompt), None))
+        except Exception as e:
+            results.put((None, e))
+    
+    def launch() -> None:
+        nonlocal last_launch
+        report["launched"] += 1
+        last_launch = time.monotonic()
+        threading.Thread(target=call, name=f"hedge-{report['launched']}", daemon=True).start()
+    
+    def collect(message) -> None:
+        report["completed"] += 1
+        report["input_tokens"] += message.usage.input_tokens
+        report["output_tokens"] += message.usage.output_tokens
+        report["cost"] += estimate_cost(getattr(message, "model", MODEL),
+                                        message.usage.input_tokens,
+                                        message.usage.output_tokens)
+        if report["valid"]:
+            return  # a simultaneous winner was already found
+        is_valid, result = validate_syntax(message.content[0].text)
+        if is_valid:
+            report.update(valid=True, code=result, error=None)
+        else:
+            report.update(code=message.content[0].text, error=result)
+    
+    launch()
+    while delay <= 0 and report["launched"] < candidates:
+        launch()
+    
+    finished = 0
+    last_error = None
+    while finished < report["launched"]:
+        timeout = None
+        if report["launched"] < candidates:
+            timeout = max(0.0, delay - (time.monotonic() - last_launch))
+        try:
+            outcomes = [results.get(timeout=timeout)]
+        except queue.Empty:
+            launch()
+            continue
+        # Account for any candidates that completed at the same time
+        while True:
+            try:
+                outcomes.append(results.get_nowait())
+            except queue.Empty:
+                break
+        
+        for message, error in outcomes:
+            finished += 1
+            if error is not None:
+                last_error = error
+            else:
+                collect(message)
+        if report["valid"]:
+            break
+        
+        # Replace the failed candidate immediately instead of waiting
+        if report["launched"] < candidates:
+            launch()
+    
+    report["abandoned"] = report["launched"] - finished
+    report["latency"] = time.monotonic() - start
+    if report["completed"] == 0 and last_error is not None:
+        raise last_error
+    return report
@@ -0,0 +1,167 @@
+# packing.py
+"""
+Pack many small specs of the same template type into a single request.
+
+The static template instructions and per-request overhead are paid once per
+pack instead of once per spec. The response is split on module markers, and
+each part is validated and saved to its own output path, with the whole
+pack's outputs committed together. Parts that are missing or invalid, or
+every part if the packed request fails, fall back to an individual request.
+"""
+import re
+import sys
+from Generate_Tests import (
+    create_message,
+    constants_section,
+    estimate_tokens,
+    generate_tests,
+    save_register_constants,
+    validate_syntax,
+    BatchWriter,
+    MAX_TOKENS
+)
+from tracing import span
+from templates import (
+    TEMPLATES,
+    REGISTER_INLINE_CONSTANTS,
+    PACKED_SPEC_BLOCK,
+    PACKED_OUTPUT_INSTRUCTIONS
+)
+
+# Specs above this size are sent individually
+DEFAULT_SMALL_SPEC_TOKENS = 400
+# Spec tokens allowed in one packed request
+DEFAULT_PACK_BUDGET = 1500
+# Upper bound on max_tokens for a packed request
+PACK_MAX_TOKENS = 16000
+# Expected output tokens per generated module (~800 for a small spec, plus
+# headroom), which caps how many specs fit in one response
+MODULE_OUTPUT_TOKENS = 1000
+
+MODULE_PATTERN = re.compile(
+    r"^# === BEGIN MODULE (\S+) ===\n(.*?)^# === END MODULE \1 ===$",
+    re.DOTALL | re.MULTILINE
+)
+
+def plan_packs(jobs: list[dict], budget: int = DEFAULT_PACK_BUDGET,
+               small_spec_tokens: int = DEFAULT_SMALL_SPEC_TOKENS,
+               module_output_tokens: int = MODULE_OUTPUT_TOKENS) -> list[list[dict]]:
+    """
+    Group jobs into packs of the same template type, up to a token budget.
+    
+    A pack is also limited to the modules that fit in PACK_MAX_TOKENS of
+    output; a truncated response would send most of its specs back as
+    individual requests, paying for them twice.
+    
+    Args:
+        jobs: Dicts with "id", "spec", "template_type" and "output_path"
+        budget: Maximum estimated spec tokens per pack
+        small_spec_tokens: Specs larger than this get a pack of their own
+        module_output_tokens: Expected output tokens per spec
+    
+    Returns:
+        list: Packs in input order; single-job packs are sent individually
+    """
+    max_specs = max(1, PACK_MAX_TOKENS // module_output_tokens)
+    packs = []
+    open_packs = {}
+    for job in jobs:
+        size = estimate_tokens(job["spec"])
+        if size > small_spec_tokens:
+            packs.append([job])
+            continue
+        
+        template_type = job["template_type"]
+        pack = open_packs.get(template_type)
+        if pack is None or pack["tokens"] + size > budget or len(pack["jobs"]) >= max_specs:
+            pack = {"jobs": [], "tokens": 0}
+            open_packs[template_type] = pack
+            packs.append(pack["jobs"])
+        pack["jobs"].append(job)
+        pack["tokens"] += size
+    return packs
+
+def render_packed_prompt(pack: list[dict]) -> str:
+    """Render one prompt covering every spec in a pack."""
+    template_type = pack[0]["template_type"]
+    specs = "\n\n".join(PACKED_SPEC_BLOCK.format(spec_id=job["id"], spec=job["spec"])
+                        for job in pack)
+    if template_type == "register":
+        section = constants_section([job["spec"] for job in pack])
+    else:
+        section = REGISTER_INLINE_CONSTANTS
+    prompt = TEMPLATES[template_type].format(spec=specs, constants_section=section)
+    return prompt + PACKED_OUTPUT_INSTRUCTIONS.format(
+        count=len(pack), ids=", ".join(job["id"] for job in pack))
+
+def split_response(text: str) -> dict[str, str]:
+    """Split a packed response into {spec id: module code}."""
+    return {match.group(1): match.group(2) for match in MODULE_PATTERN.finditer(text)}
+
+def _generate_single(job: dict, writer: BatchWriter) -> dict:
+    """
+    Generate and validate one job with its own request, queueing its output.
+    
+    Request errors are returned as a failed result, so they don't discard
+    the rest of the pack's outputs.
+    """
+    try:
+        code = generate_tests(job["spec"], job["template_type"], shared_constants=True)
+    except Exception as e:
+        return {"job": job, "ok": False, "packed": False, "error": f"{type(e).__name__}: {e}"}
+    is_valid, result = validate_syntax(code)
+    if not is_valid:
+        return {"job": job, "ok": False, "packed": False, "error": result}
+    writer.add(result, job["output_path"])
+    return {"job": job, "ok": True, "packed": False, "error": None}
+
+def _generate_pack(pack: list[dict], writer: BatchWriter) -> list[dict]:
+    """Generate a pack with one request, queueing each valid module."""
+    prompt = render_packed_prompt(pack)
+    try:
+        message = create_message(prompt, max_tokens=min(MAX_TOKENS * len(pack), PACK_MAX_TOKENS))
+        modules = split_response(message.content[0].text)
+    except Exception as e:
+        # Every spec falls back to its own request
+        print(f"Packed request failed ({type(e).__name__}: {e}); "
+              f"generating {len(pack)} specs individually", file=sys.stderr)
+        modules = {}
+    
+    results = []
+    for job in pack:
+        with span("spec", path=job["output_path"]):
+            code = modules.get(job["id"], "")
+            is_valid, result = validate_syntax(code) if code.strip() else (False, "missing")
+            if is_valid:
+                writer.add(result, job["output_path"])
+                results.append({"job": job, "ok": True, "packed": True, "error": None})
+            else:
+                results.append(_generate_single(job, writer))
+    return results
+
+def generate_packed(pack: list[dict]) -> list[dict]:
+    """
+    Generate tests for a pack with one request, falling back per spec.
+    
+    If the packed request fails, or a spec's module is missing or invalid,
+    that spec is generated with its own request. The pack's outputs are
+    committed together once every spec is done, after the register
+    constants they import have been written to the shared module.
+    
+    Returns:
+        list: One result dict per job with "job", "ok", "packed", "error" and
+        "changed" (whether its output file was written)
+    """
+    writer = BatchWriter()
+    with span("pack", specs=len(pack)), writer:
+        if len(pack) == 1:
+            with span("spec", path=pack[0]["output_path"]):
+                results = [_generate_single(pack[0], writer)]
+        else:
+            results = _generate_pack(pack, writer)
+        for result in results:
+            if result["ok"]:
+                save_register_constants(result["job"]["spec"], result["job"]["output_path"])
+    for result in results:
+        result["changed"] = result["job"]["output_path"] in writer.written
+    return results
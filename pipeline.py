@@ -0,0 +1,101 @@
+# pipeline.py
+"""
+Pipelined generate-then-run mode.
+
+Specs are generated concurrently (the stage that waits on the API). As each
+spec's code arrives and passes validate_syntax it is saved and immediately
+run with pytest in its own worker process, against the local simulators for
+its template. Results are yielded as each stage finishes, so API waits and
+test execution overlap.
+"""
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import Callable, Iterator
+from Generate_Tests import generate_tests, validate_syntax, save_tests
+from tracing import span
+from simulators import make_simulator, SPEC_ENV, TEMPLATE_ENV
+
+RUN_TIMEOUT = 300
+
+def run_generated_tests(output_path: str, spec: str, template_type: str,
+                        timeout: float = RUN_TIMEOUT) -> dict:
+    """
+    Run one generated test file with pytest in a fresh process.
+    
+    The simulators plugin installs the spec's helpers in that process, so
+    they never leak between specs.
+    """
+    env = dict(os.environ)
+    env[SPEC_ENV] = spec
+    env[TEMPLATE_ENV] = template_type
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [str(Path(__file__).resolve().parent), env.get("PYTHONPATH")]))
+    command = [sys.executable, "-m", "pytest", output_path, "-q",
+               "-p", "simulators", "-p", "no:cacheprovider"]
+    try:
+        with span("stage.run_tests", path=output_path):
+            completed = subprocess.run(command, env=env, capture_output=True,
+                                       text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {"exit_code": None, "passed": False, "output": "",
+                "summary": f"timed out after {timeout}s"}
+    lines = [line for line in completed.stdout.splitlines() if line.strip()]
+    return {
+        "exit_code": completed.returncode,
+        "passed": completed.returncode == 0,
+        "summary": lines[-1] if lines else completed.stderr.strip(),
+        "output": completed.stdout + completed.stderr,
+    }
+
+def run_pipeline(jobs: list[dict], save: Callable = None, generate: Callable = generate_tests,
+                 api_workers: int = 4, run_workers: int = 2) -> Iterator[dict]:
+    """
+    Generate, validate, save and run each job, yielding results as they finish.
+    
+    Args:
+        jobs: Dicts with "spec", "template_type" and "output_path"
+        save: Called as save(code, job) instead of save_tests, e.g. to also
+            write snapshots and register constants
+        generate: Called as generate(spec, template_type) for each job
+        api_workers: Concurrent generation requests
+        run_workers: Concurrent test processes
+    
+    Yields:
+        dict: {"job", "stage"} with stage "generate" (plus "valid"/"error")
+        when a spec's code arrives, then "run" (plus the run result and
+        whether a simulator was used) when its tests finish
+    """
+    with ThreadPoolExecutor(max_workers=api_workers) as api_pool, \
+         ThreadPoolExecutor(max_workers=run_workers) as run_pool:
+        def generate_job(job: dict) -> str:
+            with span("spec.generate", path=job["output_path"]):
+                return generate(job["spec"], job["template_type"])
+        
+        stages = {api_pool.submit(generate_job, job): ("generate", job) for job in jobs}
+        while stages:
+            done, _ = wait(stages, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, job = stages.pop(future)
+                if stage == "run":
+                    simulated = make_simulator(job["spec"], job["template_type"]) is not None
+                    yield {"job": job, "stage": "run", "simulated": simulated, **future.result()}
+                    continue
+                
+                try:
+                    is_valid, result = validate_syntax(future.result())
+                except Exception as e:
+                    is_valid, result = False, f"{type(e).__name__}: {e}"
+                if not is_valid:
+                    yield {"job": job, "stage": "generate", "valid": False, "error": result}
+                    continue
+                if save is not None:
+                    save(result, job)
+                else:
+                    save_tests(result, job["output_path"], spec=job["spec"])
+                yield {"job": job, "stage": "generate", "valid": True, "error": None}
+                run = run_pool.submit(run_generated_tests, job["output_path"],
+                                      job["spec"], job["template_type"])
+                stages[run] = ("run", job)
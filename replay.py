@@ -0,0 +1,210 @@
+# replay.py
+"""
+Offline record/replay of API responses.
+
+In record mode every create_message() call is stored, with its model,
+parameters, response text, usage and stop reason, in an indexed archive
+file. In replay mode responses are served from the archive by a hash of the
+prompt, model and max_tokens, and the API is never contacted, so air-gapped
+machines can rebuild generated_tests/ deterministically. A request made
+with another model or output budget (e.g. under a different routing
+policy) is a miss rather than another request's response.
+
+Archive layout (little-endian):
+    header   magic (8s), index offset (Q), slot count (Q)
+    records  JSON documents, back to back
+    index    open-addressing hash table of (sha256 (32s), offset (Q), length (Q))
+             slots; the slot count is a power of two
+
+The reader mmaps the file and probes the table in place, so a lookup is
+O(1) and nothing but the header and the requested record is touched.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Optional
+
+MAGIC = b"GTREPLAY"
+HEADER = struct.Struct("<8sQQ")
+SLOT = struct.Struct("<32sQQ")
+
+_session = None
+
+class ReplayMiss(LookupError):
+    """Raised in replay mode when a prompt has no recorded response."""
+
+def request_key(prompt: str, model: str, max_tokens: int) -> bytes:
+    """Archive key for a request: its prompt, model and max_tokens."""
+    return hashlib.sha256(json.dumps([model, max_tokens, prompt]).encode()).digest()
+
+def _slot_index(key: bytes, slot_count: int) -> int:
+    return int.from_bytes(key[:8], "little") & (slot_count - 1)
+
+def write_archive(path: str, records: dict[bytes, bytes]) -> None:
+    """Write {key: record JSON bytes} as an archive, atomically."""
+    slot_count = 1
+    while slot_count < 2 * max(len(records), 1):
+        slot_count *= 2
+    slots = [None] * slot_count
+
+    data = bytearray()
+    offset = HEADER.size
+    for key, record in records.items():
+        index = _slot_index(key, slot_count)
+        while slots[index] is not None:
+            index = (index + 1) & (slot_count - 1)
+        slots[index] = (key, offset + len(data), len(record))
+        data += record
+
+    empty = SLOT.pack(b"\0" * 32, 0, 0)
+    index_bytes = b"".join(SLOT.pack(*slot) if slot else empty for slot in slots)
+    header = HEADER.pack(MAGIC, HEADER.size + len(data), slot_count)
+
+    from Generate_Tests import stage_file  # deferred: Generate_Tests imports this module
+    target = Path(path)
+    os.replace(stage_file(target, header + data + index_bytes), target)
+
+class Archive:
+    """Read-only, mmap-backed view of an archive file."""
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._index_offset, self._slot_count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"Not a replay archive: {path}")
+
+    def get(self, key: bytes) -> Optional[dict]:
+        """Return the record stored under key, or None."""
+        index = _slot_index(key, self._slot_count)
+        for _ in range(self._slot_count):
+            slot_key, offset, length = SLOT.unpack_from(
+                self._map, self._index_offset + index * SLOT.size)
+            if length == 0:
+                return None
+            if slot_key == key:
+                return json.loads(self._map[offset:offset + length])
+            index = (index + 1) & (self._slot_count - 1)
+        return None
+
+    def raw_records(self) -> dict[bytes, bytes]:
+        """All {key: record JSON bytes}, e.g. to extend the archive."""
+        records = {}
+        for index in range(self._slot_count):
+            key, offset, length = SLOT.unpack_from(self._map, self._index_offset + index * SLOT.size)
+            if length:
+                records[key] = bytes(self._map[offset:offset + length])
+        return records
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+class Recorder:
+    """Collects responses during a run and writes them to the archive on close."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records = {}
+        if Path(path).exists():
+            archive = Archive(path)
+            try:
+                self._records = archive.raw_records()
+            finally:
+                archive.close()
+
+    def record(self, prompt: str, model: str, max_tokens: int, message) -> None:
+        record = {
+            "prompt_sha256": hashlib.sha256(prompt.encode()).hexdigest(),
+            "model": model,
+            "max_tokens": max_tokens,
+            "response_model": getattr(message, "model", model),
+            "id": getattr(message, "id", None),
+            "text": message.content[0].text,
+            "stop_reason": message.stop_reason,
+            "usage": {"input_tokens": message.usage.input_tokens,
+                      "output_tokens": message.usage.output_tokens},
+            "recorded_at": time.time(),
+            "prompt": prompt,
+        }
+        with self._lock:
+            self._records[request_key(prompt, model, max_tokens)] = json.dumps(record).encode()
+
+    def close(self) -> None:
+        with self._lock:
+            write_archive(self.path, self._records)
+
+def _as_message(record: dict) -> SimpleNamespace:
+    """Rebuild the parts of an API message that callers use."""
+    return SimpleNamespace(
+        id=record["id"],
+        model=record["response_model"],
+        content=[SimpleNamespace(type="text", text=record["text"])],
+        stop_reason=record["stop_reason"],
+        usage=SimpleNamespace(**record["usage"]),
+    )
+
+def replay_message(prompt: str, model: str, max_tokens: int):
+    """
+    Serve a recorded response when replaying; None if not in replay mode.
+
+    Raises:
+        ReplayMiss: In replay mode, if the prompt was never recorded with
+            this model and max_tokens
+    """
+    session = _session
+    if not isinstance(session, Archive):
+        return None
+    key = request_key(prompt, model, max_tokens)
+    record = session.get(key)
+    if record is None:
+        raise ReplayMiss(f"No recorded response for prompt {key.hex()[:16]}... "
+                         f"(model {model}, max_tokens {max_tokens}) in replay archive")
+    return _as_message(record)
+
+def is_replaying() -> bool:
+    """True while responses are served from an archive."""
+    return isinstance(_session, Archive)
+
+def record_message(prompt: str, model: str, max_tokens: int, message) -> None:
+    """Store a live response when recording; no-op otherwise."""
+    session = _session
+    if isinstance(session, Recorder):
+        session.record(prompt, model, max_tokens, message)
+
+@contextmanager
+def recording(path: Optional[str]):
+    """Record API responses made in the enclosed block to path."""
+    global _session
+    if path is None:
+        yield
+        return
+    _session = Recorder(path)
+    try:
+        yield
+    finally:
+        session, _session = _session, None
+        session.close()
+
+@contextmanager
+def replaying(path: Optional[str]):
+    """Serve API responses in the enclosed block from the archive at path."""
+    global _session
+    if path is None:
+        yield
+        return
+    _session = Archive(path)
+    try:
+        yield
+    finally:
+        session, _session = _session, None
+        session.close()
@@ -0,0 +1,163 @@
+# routing.py
+"""
+Complexity-based model routing and adaptive max_tokens.
+
+A spec's complexity is estimated from its parsed YAML (fields, operations,
+enumerated values, parameters, error lists) or, for plain text, its size.
+The score picks a tier from a policy table giving the model and output
+budget. Each routed request's outcome (latency, truncation, validation) is
+appended to a JSONL log so the policy can be tuned from real data (replayed
+responses are skipped; their latency says nothing about the model):
+
+    python routing.py [log_path]    # summarize outcomes per tier
+"""
+import json
+import sys
+import time
+import yaml
+from pathlib import Path
+from replay import is_replaying
+from Generate_Tests import (
+    render_prompt,
+    create_message,
+    validate_syntax,
+    estimate_tokens,
+    estimate_cost
+)
+
+# Kept out of generated_tests/, which holds committed outputs
+ROUTING_LOG = ".routing_log.jsonl"
+
+# Tiers are tried in order; the first whose max_score covers the spec wins.
+# A max_score of None matches everything.
+DEFAULT_POLICY = [
+    {"tier": "small", "max_score": 8, "model": "claude-3-5-haiku-20241022", "max_tokens": 2048},
+    {"tier": "medium", "max_score": 30, "model": "claude-sonnet-4-20250514", "max_tokens": 4096},
+    {"tier": "large", "max_score": None, "model": "claude-sonnet-4-20250514", "max_tokens": 8192},
+]
+
+def load_policy(policy_path: str) -> list[dict]:
+    """Load a policy table (a YAML/JSON list of tiers) from a file."""
+    with open(policy_path) as f:
+        policy = yaml.safe_load(f)
+    if not isinstance(policy, list) or not all("model" in t and "max_tokens" in t for t in policy):
+        raise ValueError(f"Invalid routing policy in {policy_path}: "
+                         f"expected a list of tiers with model and max_tokens")
+    return policy
+
+def estimate_complexity(spec: str, template_type: str = "generic") -> dict:
+    """
+    Estimate how much test code a spec will need.
+    
+    Returns:
+        dict: The counted features plus an overall "score"
+    """
+    features = {"fields": 0, "values": 0, "operations": 0, "parameters": 0,
+                "errors": 0, "coverage": 0, "spec_tokens": estimate_tokens(spec)}
+    try:
+        parsed = yaml.safe_load(spec) if template_type != "generic" else None
+    except yaml.YAMLError:
+        parsed = None
+    
+    if isinstance(parsed, dict) and isinstance(parsed.get("register"), dict):
+        fields = parsed["register"].get("fields") or []
+        features["fields"] = len(fields)
+        features["values"] = sum(len(field.get("values") or {}) for field in fields)
+        score = 2 + 3 * features["fields"] + features["values"]
+    elif isinstance(parsed, dict) and isinstance(parsed.get("interface"), dict):
+        interface = parsed["interface"]
+        operations = interface.get("operations") or []
+        features["operations"] = len(operations)
+        features["parameters"] = sum(len(op.get("parameters") or []) for op in operations)
+        features["errors"] = sum(len(op.get("errors") or []) for op in operations)
+        features["coverage"] = len(interface.get("test_coverage") or [])
+        score = (2 + 4 * features["operations"] + features["parameters"]
+                 + features["errors"] + 2 * features["coverage"])
+    else:
+        score = 2 + features["spec_tokens"] // 25
+    
+    features["score"] = score
+    return features
+
+def route(spec: str, template_type: str = "generic", policy: list[dict] = None) -> dict:
+    """Pick the policy tier for a spec; returns the tier plus its complexity."""
+    complexity = estimate_complexity(spec, template_type)
+    for tier in policy or DEFAULT_POLICY:
+        if tier.get("max_score") is None or complexity["score"] <= tier["max_score"]:
+            return {**tier, "complexity": complexity}
+    raise ValueError(f"No routing tier covers complexity score {complexity['score']}")
+
+def generate_routed(spec: str, template_type: str = "generic", policy: list[dict] = None,
+                    log_path: str = ROUTING_LOG, shared_constants: bool = False) -> tuple[str, dict]:
+    """
+    Generate tests with the routed model and output budget, logging the outcome
+    unless the response was replayed from an archive.
+    
+    shared_constants is passed on to Generate_Tests.render_prompt.
+    
+    Returns:
+        tuple: (generated code, outcome record)
+    """
+    decision = route(spec, template_type, policy)
+    prompt = render_prompt(spec, template_type, shared_constants)
+    start = time.monotonic()
+    message = create_message(prompt, max_tokens=decision["max_tokens"], model=decision["model"])
+    latency = time.monotonic() - start
+    code = message.content[0].text
+    is_valid, _ = validate_syntax(code)
+    
+    outcome = {
+        "time": time.time(),
+        "template_type": template_type,
+        "tier": decision.get("tier"),
+        "model": decision["model"],
+        "max_tokens": decision["max_tokens"],
+        "complexity": decision["complexity"],
+        "latency": round(latency, 3),
+        "input_tokens": message.usage.input_tokens,
+        "output_tokens": message.usage.output_tokens,
+        "cost": estimate_cost(decision["model"], message.usage.input_tokens,
+                              message.usage.output_tokens),
+        "truncated": message.stop_reason == "max_tokens",
+        "valid": is_valid,
+    }
+    if log_path and not is_replaying():
+        Path(log_path).parent.mkdir(parents=True, exist_ok=True)
+        with open(log_path, "a") as f:
+            f.write(json.dumps(outcome) + "\n")
+    return code, outcome
+
+def summarize_outcomes(log_path: str = ROUTING_LOG) -> dict:
+    """Aggregate logged outcomes per (tier, model) for policy tuning."""
+    summary = {}
+    with open(log_path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            outcome = json.loads(line)
+            entry = summary.setdefault(f"{outcome['tier']} ({outcome['model']})", {
+                "requests": 0, "latency": 0.0, "truncated": 0, "valid": 0,
+                "output_tokens": 0, "max_score": 0})
+            entry["requests"] += 1
+            entry["latency"] += outcome["latency"]
+            entry["truncated"] += outcome["truncated"]
+            entry["valid"] += outcome["valid"]
+            entry["output_tokens"] += outcome["output_tokens"]
+            entry["max_score"] = max(entry["max_score"], outcome["complexity"]["score"])
+    for entry in summary.values():
+        count = entry["requests"]
+        entry["latency"] = entry["latency"] / count
+        entry["output_tokens"] = entry["output_tokens"] / count
+        entry["truncation_rate"] = entry.pop("truncated") / count
+        entry["pass_rate"] = entry.pop("valid") / count
+    return summary
+
+if __name__ == "__main__":
+    log = sys.argv[1] if len(sys.argv) > 1 else ROUTING_LOG
+    for tier, entry in summarize_outcomes(log).items():
+        print(f"{tier}: {entry['requests']} requests, "
+              f"mean latency {entry['latency']:.1f}s, "
+              f"mean output {entry['output_tokens']:.0f} tokens, "
+              f"truncated {entry['truncation_rate']:.0%}, "
+              f"valid {entry['pass_rate']:.0%}, "
+              f"max score {entry['max_score']}")
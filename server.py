@@ -0,0 +1,190 @@
+# server.py
+"""
+Long-running generation service with request coalescing.
+
+Serves the generate_tests/validate_syntax pipeline over HTTP (TCP or a Unix
+socket). One warm API client and a response cache are shared by all callers,
+and identical in-flight requests (same rendered prompt) are coalesced into a
+single upstream call.
+
+Endpoints (JSON bodies):
+    POST /generate  {"spec", "template_type", "shared_constants"}
+                                              -> {"code", "valid", "result"}
+    POST /validate  {"code"}                  -> {"valid", "result"}
+    GET  /stats                               -> request/upstream/cache counters
+"""
+import hashlib
+import http.client
+import json
+import os
+import socket
+import socketserver
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from Generate_Tests import render_prompt, create_message, validate_syntax
+
+DEFAULT_ADDRESS = "http://127.0.0.1:8765"
+CACHE_SIZE = 256
+
+class GenerationService:
+    """Coalescing, caching front end for create_message()."""
+
+    def __init__(self, cache_size: int = CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "upstream_calls": 0, "coalesced": 0, "cache_hits": 0}
+
+    def generate(self, spec: str, template_type: str = "generic",
+                 shared_constants: bool = False) -> str:
+        """Return generated code, sharing upstream calls for identical prompts."""
+        prompt = render_prompt(spec, template_type, shared_constants)
+        key = hashlib.sha256(prompt.encode()).hexdigest()
+
+        with self._lock:
+            self.stats["requests"] += 1
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                return self._cache[key]
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+                self.stats["upstream_calls"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            code = create_message(prompt).content[0].text
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+
+        # Coalesced callers share this response either way, but only code that
+        # validates is cached; a bad completion is retried on the next request
+        is_valid, _ = validate_syntax(code)
+        with self._lock:
+            del self._in_flight[key]
+            if is_valid:
+                self._cache[key] = code
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        future.set_result(code)
+        return code
+
+class _Handler(BaseHTTPRequestHandler):
+    service = None  # set by make_server()
+
+    def address_string(self) -> str:
+        # Unix socket peers have no host part
+        return self.client_address[0] if self.client_address else "unix"
+
+    def _reply(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._reply(200, dict(self.service.stats))
+        else:
+            self._reply(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            if self.path == "/generate":
+                code = self.service.generate(request["spec"], request.get("template_type", "generic"),
+                                             bool(request.get("shared_constants", False)))
+                is_valid, result = validate_syntax(code)
+                self._reply(200, {"code": code, "valid": is_valid, "result": result})
+            elif self.path == "/validate":
+                is_valid, result = validate_syntax(request["code"])
+                self._reply(200, {"valid": is_valid, "result": result})
+            else:
+                self._reply(404, {"error": f"Unknown path: {self.path}"})
+        except (ValueError, KeyError) as e:
+            self._reply(400, {"error": str(e)})
+        except Exception as e:
+            self._reply(502, {"error": f"{type(e).__name__}: {e}"})
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def make_server(address: str = DEFAULT_ADDRESS, service: GenerationService = None):
+    """
+    Create (but do not start) a server for `http://host:port` or `unix:/path`.
+    """
+    handler = type("Handler", (_Handler,), {"service": service or GenerationService()})
+    if address.startswith("unix:"):
+        path = address[len("unix:"):]
+        if os.path.exists(path):
+            os.unlink(path)
+        return _UnixHTTPServer(path, handler)
+    url = urlparse(address)
+    port = url.port if url.port is not None else 8765
+    return ThreadingHTTPServer((url.hostname or "127.0.0.1", port), handler)
+
+def serve(address: str = DEFAULT_ADDRESS) -> None:
+    """Run the generation service until interrupted."""
+    server = make_server(address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if address.startswith("unix:") and os.path.exists(address[len("unix:"):]):
+            os.unlink(address[len("unix:"):])
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+def _request(address: str, method: str, path: str, payload: dict = None,
+             timeout: float = 600) -> dict:
+    if address.startswith("unix:"):
+        conn = _UnixHTTPConnection(address[len("unix:"):], timeout)
+    else:
+        url = urlparse(address)
+        conn = http.client.HTTPConnection(url.hostname, url.port, timeout=timeout)
+    try:
+        body = json.dumps(payload).encode() if payload is not None else None
+        conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        result = json.loads(response.read())
+    finally:
+        conn.close()
+    if response.status != 200:
+        raise RuntimeError(f"Server error ({response.status}): {result.get('error')}")
+    return result
+
+def remote_generate(address: str, spec: str, template_type: str = "generic",
+                    shared_constants: bool = False) -> str:
+    """Thin client: generate tests through a running server."""
+    return _request(address, "POST", "/generate",
+                    {"spec": spec, "template_type": template_type,
+                     "shared_constants": shared_constants})["code"]
+
+def remote_stats(address: str) -> dict:
+    """Fetch the server's request/upstream/cache counters."""
+    return _request(address, "GET", "/stats")
@@ -0,0 +1,170 @@
+# simulators.py
+"""
+Local stand-ins for the hardware helpers generated tests assume.
+
+Register tests call read_register/write_register/reset_device; interface
+tests call i2c_write/i2c_read/i2c_write_read/i2c_probe/reset_controller.
+These simulators implement them from the parsed spec so generated suites
+can run without hardware. They are best-effort models for catching broken
+suites early, not a substitute for the real device.
+
+Also usable as a pytest plugin (`-p simulators`): the spec and template type
+are read from the GENERATE_TESTS_SPEC and GENERATE_TESTS_TEMPLATE
+environment variables.
+"""
+import builtins
+import os
+import re
+import yaml
+from Generate_Tests import field_bits
+
+SPEC_ENV = "GENERATE_TESTS_SPEC"
+TEMPLATE_ENV = "GENERATE_TESTS_TEMPLATE"
+
+class RegisterSimulator:
+    """A single register: RW fields are writable, RO fields keep their value."""
+
+    def __init__(self, register: dict):
+        self.address = register["address"]
+        self.reset_value = register.get("reset_value", 0)
+        self.writable_mask = 0
+        for field in register.get("fields", []):
+            if str(field.get("access", "RW")).upper() in ("RW", "WO"):
+                msb, lsb = field_bits(field["bits"])
+                self.writable_mask |= ((1 << (msb - lsb + 1)) - 1) << lsb
+        self.value = self.reset_value
+
+    def read_register(self, address: int) -> int:
+        if address != self.address:
+            raise ValueError(f"No register at address 0x{address:X}")
+        return self.value
+
+    def write_register(self, address: int, value: int) -> None:
+        if address != self.address:
+            raise ValueError(f"No register at address 0x{address:X}")
+        self.value = (self.value & ~self.writable_mask) | (value & self.writable_mask)
+
+    def reset_device(self) -> None:
+        self.value = self.reset_value
+
+    def helpers(self) -> dict:
+        return {
+            "read_register": self.read_register,
+            "write_register": self.write_register,
+            "reset_device": self.reset_device,
+        }
+
+class I2CError(Exception):
+    """Bus error raised by the I2C simulator; `code` is e.g. "NACK"."""
+
+    def __init__(self, code: str, message: str = ""):
+        super().__init__(message or code)
+        self.code = code
+
+class I2CSimulator:
+    """
+    An I2C bus where every non-reserved 7-bit address (0x08-0x77) ACKs.
+
+    Each device has 256 bytes of memory; the first written byte selects the
+    memory offset for subsequent reads. Transfer size limits are taken from
+    the spec's parameter descriptions ("max N", "N-M").
+    """
+
+    def __init__(self, interface: dict):
+        self.max_write = 256
+        self.min_read, self.max_read = 1, 256
+        for operation in interface.get("operations") or []:
+            for parameter in operation.get("parameters") or []:
+                for name, description in parameter.items():
+                    description = str(description)
+                    limit = re.search(r"max (\d+)", description)
+                    span = re.search(r"(\d+)\s*-\s*(\d+)", description)
+                    if limit and name == "data":
+                        self.max_write = int(limit.group(1))
+                    if span and name == "length":
+                        self.min_read, self.max_read = int(span.group(1)), int(span.group(2))
+        self.reset_controller()
+
+    def reset_controller(self) -> None:
+        self.memory = {}
+        self.pointer = {}
+
+    def _device(self, device_addr: int) -> bytearray:
+        if not isinstance(device_addr, int) or not 0 <= device_addr <= 0x7F:
+            raise ValueError(f"Invalid 7-bit address: {device_addr!r}")
+        if not 0x08 <= device_addr <= 0x77:
+            raise I2CError("NACK", f"No ACK from 0x{device_addr:02X}")
+        return self.memory.setdefault(device_addr, bytearray(256))
+
+    def i2c_write(self, device_addr: int, data: bytes) -> None:
+        memory = self._device(device_addr)
+        if not isinstance(data, (bytes, bytearray)):
+            raise TypeError("data must be bytes")
+        if len(data) > self.max_write:
+            raise ValueError(f"Write of {len(data)} bytes exceeds max {self.max_write}")
+        if data:
+            offset = data[0]
+            for i, byte in enumerate(data[1:]):
+                memory[(offset + i) % len(memory)] = byte
+            self.pointer[device_addr] = offset
+
+    def i2c_read(self, device_addr: int, length: int) -> bytes:
+        memory = self._device(device_addr)
+        if not self.min_read <= length <= self.max_read:
+            raise ValueError(f"Read length {length} outside {self.min_read}-{self.max_read}")
+        offset = self.pointer.get(device_addr, 0)
+        return bytes(memory[(offset + i) % len(memory)] for i in range(length))
+
+    def i2c_write_read(self, device_addr: int, write_data: bytes, read_length: int) -> bytes:
+        self.i2c_write(device_addr, write_data)
+        return self.i2c_read(device_addr, read_length)
+
+    def i2c_probe(self, device_addr: int) -> bool:
+        try:
+            self._device(device_addr)
+        except I2CError:
+            return False
+        return True
+
+    def helpers(self) -> dict:
+        return {
+            "i2c_write": self.i2c_write,
+            "i2c_read": self.i2c_read,
+            "i2c_write_read": self.i2c_write_read,
+            "i2c_probe": self.i2c_probe,
+            "reset_controller": self.reset_controller,
+            "I2CError": I2CError,
+        }
+
+def make_simulator(spec: str, template_type: str):
+    """Build the simulator for a spec, or None if its template has no helpers."""
+    if template_type not in ("register", "interface"):
+        return None
+    try:
+        parsed = yaml.safe_load(spec)
+    except yaml.YAMLError:
+        return None
+    if template_type == "register" and isinstance(parsed, dict) and "register" in parsed:
+        return RegisterSimulator(parsed["register"])
+    if template_type == "interface" and isinstance(parsed, dict) and "interface" in parsed:
+        return I2CSimulator(parsed["interface"])
+    return None
+
+def install_helpers(spec: str, template_type: str):
+    """
+    Expose a spec's simulator helpers as builtins for the generated tests.
+
+    Generated tests call the helpers without importing them, so this must
+    run in the process that executes the tests.
+    """
+    simulator = make_simulator(spec, template_type)
+    if simulator is not None:
+        for name, helper in simulator.helpers().items():
+            setattr(builtins, name, helper)
+    return simulator
+
+def pytest_configure(config):
+    """Install the helpers for the spec named in the environment."""
+    spec = os.environ.get(SPEC_ENV)
+    if spec:
+        install_helpers(spec, os.environ.get(TEMPLATE_ENV, "generic"))
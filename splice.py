@@ -0,0 +1,251 @@
+# splice.py
+"""
+Spec-diff-aware partial regeneration.
+
+The normalized spec used for the last generation is snapshotted next to the
+output file. On an update, the old and new specs are diffed by register
+field or interface operation. Tests are requested only for what changed,
+and are spliced into the existing module via the AST. Unaffected tests are
+left byte-identical.
+"""
+import ast
+import copy
+import yaml
+from pathlib import Path
+from typing import Optional
+from Generate_Tests import render_prompt, create_message, validate_syntax, save_tests
+from templates import PARTIAL_REGEN_INSTRUCTIONS
+
+SNAPSHOT_DIR = ".spec_snapshots"
+
+# Structured spec kinds: top-level key -> list of named items that can be diffed
+ITEM_KEYS = {
+    "register": "fields",
+    "interface": "operations",
+}
+
+def snapshot_path(output_path: str) -> Path:
+    """Path of the spec snapshot kept for a generated test file."""
+    path = Path(output_path)
+    return path.parent / SNAPSHOT_DIR / f"{path.stem}.yaml"
+
+def save_snapshot(spec: str, output_path: str) -> None:
+    """Record the spec a test file was generated from."""
+    save_tests(spec, str(snapshot_path(output_path)))
+
+def diff_specs(old_spec: str, new_spec: str) -> Optional[dict]:
+    """
+    Diff two structured specs by their named items.
+    
+    Returns:
+        dict: {"kind", "changed", "removed"} with item names, or None if
+        something outside the items changed and a full regeneration is needed
+    """
+    try:
+        old, new = yaml.safe_load(old_spec), yaml.safe_load(new_spec)
+    except yaml.YAMLError:
+        return None
+    if not isinstance(old, dict) or not isinstance(new, dict) or old.keys() != new.keys():
+        return None
+    
+    kind = next((key for key in ITEM_KEYS if key in new), None)
+    if kind is None:
+        return None
+    # Top-level keys next to the register/interface (notes, config) feed
+    # every test, so any change there needs a full regeneration
+    if {k: v for k, v in old.items() if k != kind} != {k: v for k, v in new.items() if k != kind}:
+        return None
+    items_key = ITEM_KEYS[kind]
+    old_body, new_body = dict(old[kind]), dict(new[kind])
+    old_items = {item["name"]: item for item in old_body.pop(items_key, None) or []}
+    new_items = {item["name"]: item for item in new_body.pop(items_key, None) or []}
+    if old_body != new_body:
+        return None
+    
+    changed = [name for name, item in new_items.items() if old_items.get(name) != item]
+    removed = [name for name in old_items if name not in new_items]
+    return {"kind": kind, "changed": changed, "removed": removed,
+            "all": list(new_items) + removed}
+
+def _unit_items(test_name: str, item_names: list[str]) -> set[str]:
+    """
+    Match spec item names against a test name's underscore-separated words.
+    
+    Longer names win, so `write_then_read` is not also counted as `write`.
+    """
+    words = test_name.lower().split("_")
+    matched = set()
+    taken = [False] * len(words)
+    for name in sorted(item_names, key=lambda n: -len(n.split("_"))):
+        parts = name.lower().split("_")
+        for start in range(len(words) - len(parts) + 1):
+            span = range(start, start + len(parts))
+            if words[start:start + len(parts)] == parts and not any(taken[i] for i in span):
+                matched.add(name)
+                for i in span:
+                    taken[i] = True
+    return matched
+
+def _test_units(tree: ast.Module):
+    """Yield (qualified name, node) for test functions and test class methods."""
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test"):
+            yield node.name, node
+        elif isinstance(node, ast.ClassDef):
+            for child in node.body:
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)) and child.name.startswith("test"):
+                    yield f"{node.name}.{child.name}", child
+
+def affected_tests(code: str, diff: dict) -> set[str]:
+    """Qualified names of tests that exercise a changed or removed item."""
+    stale = set(diff["changed"]) | set(diff["removed"])
+    return {qualname for qualname, node in _test_units(ast.parse(code))
+            if _unit_items(node.name, diff["all"]) & stale}
+
+def _span(node: ast.AST) -> tuple[int, int]:
+    """0-based [start, end) line span of a node, including decorators."""
+    start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+    return start - 1, node.end_lineno
+
+def _source(lines: list[str], node: ast.AST) -> str:
+    start, end = _span(node)
+    return "".join(lines[start:end]).rstrip("\n") + "\n"
+
+def _node_name(node: ast.AST) -> Optional[str]:
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        return node.name
+    if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+        return node.targets[0].id
+    return None
+
+def _import_key(node: ast.AST, alias: ast.alias) -> tuple:
+    """Identity of one imported name, e.g. ("from", "module", 0, "NAME", None)."""
+    if isinstance(node, ast.ImportFrom):
+        return "from", node.module, node.level, alias.name, alias.asname
+    return "import", alias.name, alias.asname
+
+def splice_tests(old_code: str, new_code: str, affected: set[str]) -> str:
+    """
+    Replace affected tests in old_code with the definitions from new_code.
+    
+    New imports, helpers and tests are added; definitions that already exist
+    and are not affected keep their original source.
+    """
+    if old_code and not old_code.endswith("\n"):
+        old_code += "\n"
+    lines = old_code.splitlines(keepends=True)
+    new_lines = new_code.splitlines(keepends=True)
+    old_tree, new_tree = ast.parse(old_code), ast.parse(new_code)
+    
+    removed = set()
+    first_removed = None
+    for qualname, node in _test_units(old_tree):
+        if qualname in affected:
+            start, end = _span(node)
+            while end < len(lines) and not lines[end].strip():
+                end += 1
+            removed.update(range(start, end))
+            if "." not in qualname and (first_removed is None or start < first_removed):
+                first_removed = start
+    
+    old_names = {_node_name(node): node for node in old_tree.body if _node_name(node)}
+    old_imports = {_import_key(node, alias) for node in old_tree.body
+                   if isinstance(node, (ast.Import, ast.ImportFrom)) for alias in node.names}
+    import_at = max((node.end_lineno for node in old_tree.body
+                     if isinstance(node, (ast.Import, ast.ImportFrom))), default=0)
+    top_level_at = first_removed if first_removed is not None else len(lines)
+    
+    inserts = {}
+    def insert(index: int, text: str) -> None:
+        inserts.setdefault(index, []).append(text)
+    
+    for node in new_tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            missing = [alias for alias in node.names if _import_key(node, alias) not in old_imports]
+            if len(missing) == len(node.names):
+                insert(import_at, _source(new_lines, node))
+            elif missing:
+                # Only the names the old module doesn't import yet
+                reduced = copy.copy(node)
+                reduced.names = missing
+                insert(import_at, ast.unparse(reduced) + "\n")
+            continue
+        name = _node_name(node)
+        if name is None:
+            continue
+        existing = old_names.get(name)
+        if isinstance(node, ast.ClassDef) and isinstance(existing, ast.ClassDef):
+            old_methods = {child.name for child in existing.body if hasattr(child, "name")}
+            for child in node.body:
+                if not isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    continue
+                if child.name not in old_methods or f"{name}.{child.name}" in affected:
+                    insert(_span(existing)[1], "\n" + _source(new_lines, child))
+        elif existing is None or name in affected:
+            if top_level_at < len(lines):
+                insert(top_level_at, _source(new_lines, node) + "\n")
+            else:
+                insert(top_level_at, "\n" + _source(new_lines, node))
+    
+    out = []
+    for index in range(len(lines) + 1):
+        out.extend(inserts.get(index, []))
+        if index < len(lines) and index not in removed:
+            out.append(lines[index])
+    return "".join(out)
+
+def partial_spec(spec: str, diff: dict) -> str:
+    """Reduce a structured spec to the items that changed."""
+    parsed = copy.deepcopy(yaml.safe_load(spec))
+    items_key = ITEM_KEYS[diff["kind"]]
+    body = parsed[diff["kind"]]
+    body[items_key] = [item for item in body.get(items_key) or [] if item["name"] in diff["changed"]]
+    return yaml.dump(parsed, default_flow_style=False)
+
+def update_tests(spec: str, template_type: str, output_path: str,
+                 shared_constants: bool = False) -> tuple[str, Optional[str]]:
+    """
+    Regenerate only the tests affected by spec changes since the last run.
+    
+    shared_constants is passed on to Generate_Tests.render_prompt; save the
+    result with save_tests(..., spec=spec) if it is set.
+    
+    Returns:
+        tuple: (status, code) where status is "unchanged", "spliced" or
+        "full"; code is the spliced module for "spliced" and None otherwise,
+        and "full" means the caller should regenerate the whole file
+    """
+    snapshot, output = snapshot_path(output_path), Path(output_path)
+    if not snapshot.exists() or not output.exists():
+        return "full", None
+    old_spec = snapshot.read_text()
+    if old_spec == spec:
+        return "unchanged", None
+    
+    diff = diff_specs(old_spec, spec)
+    old_code = output.read_text()
+    try:
+        affected = affected_tests(old_code, diff) if diff else None
+    except SyntaxError:
+        affected = None
+    if diff is None or affected is None:
+        return "full", None
+    if not diff["changed"] and not affected:
+        return "spliced", old_code
+    
+    new_code = ""
+    if diff["changed"]:
+        item_label = ITEM_KEYS[diff["kind"]][:-1]
+        # Render from the YAML-only reduced spec so register constants can still
+        # be precomputed, then append the partial-regeneration instructions
+        prompt = render_prompt(partial_spec(spec, diff), template_type, shared_constants) + PARTIAL_REGEN_INSTRUCTIONS.format(
+            item=item_label, names=", ".join(diff["changed"]))
+        is_valid, new_code = validate_syntax(create_message(prompt).content[0].text)
+        if not is_valid:
+            return "full", None
+    
+    spliced = splice_tests(old_code, new_code, affected)
+    is_valid, _ = validate_syntax(spliced)
+    if not is_valid:
+        return "full", None
+    return "spliced", spliced
@@ -41,9 +41,18 @@ Assume these helper functions exist:
 - `reset_device() -> None`
 
 Output only valid python code with descriptive test names.
-Use constants for addresses and masks at the top of the file.
+{constants_section}
 """
 
+REGISTER_CONSTANTS_SECTION = """The address, mask, bit position and named value constants are already
+defined in the shared module `{module}`:
+
+{constants}
+Import the ones you use with `from {module} import ...`.
+Do not redefine any of these constants in the test file."""
+
+REGISTER_INLINE_CONSTANTS = "Use constants for addresses and masks at the top of the file."
+
 INTERFACE_TEST_TEMPLATE = """You are a hardware validation engineer generating pytest tests.
 
 Interface specification:
@@ -63,4 +72,26 @@ TEMPLATES = {
     "generic": GENERIC_TEST_TEMPLATE,
     "register": REGISTER_TEST_TEMPLATE,
     "interface": INTERFACE_TEST_TEMPLATE,
-}
\ No newline at end of file
+}
+
+# Used by packing mode: several small specs of one template type share a request
+PACKED_SPEC_BLOCK = """=== Spec `{spec_id}` ===
+{spec}"""
+
+PACKED_OUTPUT_INSTRUCTIONS = """
+The specification above contains {count} independent specs. Generate a separate,
+self-contained test module for each one, and wrap each module exactly like this:
+
+# === BEGIN MODULE <spec id> ===
+<python code>
+# === END MODULE <spec id> ===
+
+Emit the modules in this order: {ids}
+Write nothing outside the markers.
+"""
+
+# Appended to a reduced spec when only some tests are regenerated
+PARTIAL_REGEN_INSTRUCTIONS = """
+Only the {item}s in the specification above changed: {names}.
+Tests for everything else already exist. Generate only the tests specific to
+these {item}s, and do not repeat reset-value or other shared tests."""
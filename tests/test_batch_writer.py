@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+import Generate_Tests
+from Generate_Tests import BatchWriter, save_tests
+
+def test_commit_writes_all_outputs(tmp_path):
+    writer = BatchWriter()
+    writer.add("a = 1\n", str(tmp_path / "a.py"))
+    writer.add("b = 1\n", str(tmp_path / "sub" / "b.py"))
+    assert sorted(writer.commit()) == [str(tmp_path / "a.py"), str(tmp_path / "sub" / "b.py")]
+    assert (tmp_path / "a.py").read_text() == "a = 1\n"
+    assert (tmp_path / "sub" / "b.py").read_text() == "b = 1\n"
+
+def test_unchanged_outputs_are_skipped(tmp_path):
+    same, changed = tmp_path / "same.py", tmp_path / "changed.py"
+    same.write_text("x = 1\n")
+    changed.write_text("x = 1\n")
+    os.utime(same, ns=(1_000_000_000, 1_000_000_000))
+
+    with BatchWriter() as writer:
+        writer.add("x = 1\n", str(same))
+        writer.add("x = 2\n", str(changed))
+    assert writer.written == [str(changed)]
+    assert same.stat().st_mtime_ns == 1_000_000_000
+    assert changed.read_text() == "x = 2\n"
+
+def test_later_add_replaces_earlier(tmp_path):
+    with BatchWriter() as writer:
+        writer.add("x = 1\n", str(tmp_path / "a.py"))
+        writer.add("x = 2\n", str(tmp_path / "a.py"))
+    assert writer.written == [str(tmp_path / "a.py")]
+    assert (tmp_path / "a.py").read_text() == "x = 2\n"
+
+def test_failed_staging_touches_no_target(tmp_path, monkeypatch):
+    first, second = tmp_path / "first.py", tmp_path / "second.py"
+    first.write_text("old\n")
+    stage_file = Generate_Tests.stage_file
+    calls = []
+    def failing_stage_file(path, data):
+        calls.append(path)
+        if len(calls) == 2:
+            raise OSError("disk full")
+        return stage_file(path, data)
+    monkeypatch.setattr(Generate_Tests, "stage_file", failing_stage_file)
+
+    writer = BatchWriter()
+    writer.add("new\n", str(first))
+    writer.add("new\n", str(second))
+    with pytest.raises(OSError):
+        writer.commit()
+    assert first.read_text() == "old\n"
+    assert not second.exists()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["first.py"]  # temp files removed
+
+def test_exception_in_block_discards_batch(tmp_path):
+    with pytest.raises(RuntimeError):
+        with BatchWriter() as writer:
+            writer.add("x = 1\n", str(tmp_path / "a.py"))
+            raise RuntimeError("generation failed")
+    assert not (tmp_path / "a.py").exists()
+    assert writer.commit() == []
+
+def test_new_files_get_normal_mode(tmp_path):
+    save_tests("x = 1\n", str(tmp_path / "a.py"))
+    with BatchWriter() as writer:
+        writer.add("x = 1\n", str(tmp_path / "b.py"))
+    expected = 0o666 & ~Generate_Tests._UMASK
+    assert (tmp_path / "a.py").stat().st_mode & 0o777 == expected
+    assert (tmp_path / "b.py").stat().st_mode & 0o777 == expected
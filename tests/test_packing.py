@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+
+import pytest
+
+import packing
+from packing import generate_packed, plan_packs, split_response, PACK_MAX_TOKENS
+
+VALID = "def test_ok():\n    assert True\n"
+
+def job(tmp_path, spec_id, spec="Function: f() -> int", template_type="generic"):
+    return {"id": spec_id, "spec": spec, "template_type": template_type,
+            "output_path": str(tmp_path / f"{spec_id}.py")}
+
+def module(spec_id, code=VALID):
+    return f"# === BEGIN MODULE {spec_id} ===\n{code}# === END MODULE {spec_id} ==="
+
+def message(text):
+    return SimpleNamespace(content=[SimpleNamespace(text=text)])
+
+def test_split_response():
+    text = "preamble\n" + module("test_a") + "\n\n" + module("test_b", "x = 1\n") + "\ntrailer"
+    assert split_response(text) == {"test_a": VALID, "test_b": "x = 1\n"}
+
+def test_split_response_ignores_unterminated_module():
+    text = module("test_a") + "\n# === BEGIN MODULE test_b ===\ndef test_cut("
+    assert split_response(text) == {"test_a": VALID}
+
+def test_plan_packs_by_template_and_budget(tmp_path):
+    jobs = [job(tmp_path, "a"), job(tmp_path, "b", template_type="register"),
+            job(tmp_path, "c"), job(tmp_path, "big", spec="x" * 4000)]
+    packs = plan_packs(jobs, budget=1500)
+    assert [[j["id"] for j in pack] for pack in packs] == [["a", "c"], ["b"], ["big"]]
+
+def test_plan_packs_limits_expected_output(tmp_path):
+    jobs = [job(tmp_path, f"s{i}") for i in range(40)]
+    packs = plan_packs(jobs, budget=10_000, module_output_tokens=1000)
+    assert [len(pack) for pack in packs] == [16, 16, 8]
+    assert all(len(pack) * 1000 <= PACK_MAX_TOKENS for pack in packs)
+
+@pytest.fixture
+def stub_api(monkeypatch):
+    calls = {"packed": [], "single": []}
+    def install(packed, single=lambda spec: VALID):
+        def create_message(prompt, *args, **kwargs):
+            calls["packed"].append(prompt)
+            if isinstance(packed, Exception):
+                raise packed
+            return message(packed)
+        def generate_tests(spec, template_type, shared_constants=False):
+            calls["single"].append(spec)
+            result = single(spec)
+            if isinstance(result, Exception):
+                raise result
+            return result
+        monkeypatch.setattr(packing, "create_message", create_message)
+        monkeypatch.setattr(packing, "generate_tests", generate_tests)
+        return calls
+    return install
+
+def outcomes(results):
+    return [(r["job"]["id"], r["ok"], r["packed"], r["changed"]) for r in results]
+
+def test_packed_modules_are_saved(tmp_path, stub_api):
+    calls = stub_api(module("a") + "\n" + module("b"))
+    pack = [job(tmp_path, "a", "spec a"), job(tmp_path, "b", "spec b")]
+    assert outcomes(generate_packed(pack)) == [("a", True, True, True), ("b", True, True, True)]
+    assert calls["single"] == []
+    assert (tmp_path / "a.py").read_text() == VALID.strip()
+
+def test_missing_and_invalid_modules_fall_back(tmp_path, stub_api):
+    calls = stub_api(module("a") + "\n" + module("b", "def broken(:\n"))
+    pack = [job(tmp_path, "a", "spec a"), job(tmp_path, "b", "spec b"), job(tmp_path, "c", "spec c")]
+    assert outcomes(generate_packed(pack)) == [
+        ("a", True, True, True), ("b", True, False, True), ("c", True, False, True)]
+    assert calls["single"] == ["spec b", "spec c"]
+
+def test_failed_packed_request_falls_back_per_spec(tmp_path, stub_api):
+    calls = stub_api(RuntimeError("overloaded"))
+    pack = [job(tmp_path, "a", "spec a"), job(tmp_path, "b", "spec b")]
+    assert outcomes(generate_packed(pack)) == [("a", True, False, True), ("b", True, False, True)]
+    assert calls["single"] == ["spec a", "spec b"]
+
+def test_failed_fallback_keeps_other_outputs(tmp_path, stub_api):
+    stub_api(module("a"), single=lambda spec: RuntimeError("timeout"))
+    pack = [job(tmp_path, "a", "spec a"), job(tmp_path, "b", "spec b")]
+    results = generate_packed(pack)
+    assert outcomes(results) == [("a", True, True, True), ("b", False, False, False)]
+    assert "timeout" in results[1]["error"]
+    assert (tmp_path / "a.py").exists() and not (tmp_path / "b.py").exists()
+
+def test_unchanged_outputs_are_not_rewritten(tmp_path, stub_api):
+    stub_api(module("a") + "\n" + module("b"))
+    pack = [job(tmp_path, "a", "spec a"), job(tmp_path, "b", "spec b")]
+    generate_packed(pack)
+    assert outcomes(generate_packed(pack)) == [("a", True, True, False), ("b", True, True, False)]
@@ -0,0 +1,62 @@
+import pytest
+
+from Generate_Tests import build_register_constants, render_prompt, save_tests, CONSTANTS_MODULE
+
+SPEC = """
+register:
+  name: CTRL
+  address: 0x1000
+  reset_value: 0x0
+  fields:
+    - name: ENABLE
+      bits: [0]
+    - name: MODE
+      bits: [4, 2]
+      values:
+        0: IDLE
+        2: LOW_POWER
+"""
+
+def register(fields):
+    return "register:\n  name: R\n  address: 0x10\n  fields:\n" + fields
+
+def test_builds_prefixed_constants():
+    name, source = build_register_constants(SPEC)
+    assert name == "CTRL"
+    assert source == ("CTRL_ADDR = 0x1000\n"
+                      "CTRL_WIDTH = 32\n"
+                      "CTRL_RESET_VALUE = 0x00000000\n"
+                      "\n"
+                      "CTRL_ENABLE_MASK = 0x1\n"
+                      "CTRL_ENABLE_POS = 0\n"
+                      "\n"
+                      "CTRL_MODE_MASK = 0x1C\n"
+                      "CTRL_MODE_POS = 2\n"
+                      "CTRL_MODE_IDLE = 0\n"
+                      "CTRL_MODE_LOW_POWER = 2\n")
+
+@pytest.mark.parametrize("spec", [
+    "register:\n  address: 0x10\n",                                    # no name
+    "register:\n  name: R\n",                                          # no address
+    register("    - name: A\n"),                                       # no bits
+    register("    - bits: [1]\n"),                                     # no field name
+    register("    - name: A\n      bits: [1]\n      values:\n        0: LOW POWER\n"),
+    register("    - name: A\n      bits: [3, 0]\n      values:\n        1: MASK\n"),
+    register("    - name: A\n      bits: [1]\n    - name: A\n      bits: [2]\n"),
+    register("    - name: A B\n      bits: [1]\n"),
+])
+def test_unsafe_specs_fall_back(spec):
+    assert build_register_constants(spec) is None
+    assert CONSTANTS_MODULE not in render_prompt(spec, "register", shared_constants=True)
+
+def test_shared_constants_are_opt_in():
+    assert CONSTANTS_MODULE not in render_prompt(SPEC, "register")
+    assert CONSTANTS_MODULE in render_prompt(SPEC, "register", shared_constants=True)
+
+def test_save_tests_writes_constants_next_to_tests(tmp_path):
+    output = tmp_path / "test_ctrl.py"
+    save_tests("from register_constants import CTRL_ADDR\n", str(output), spec=SPEC)
+    namespace = {}
+    exec((tmp_path / f"{CONSTANTS_MODULE}.py").read_text(), namespace)
+    assert namespace["CTRL_MODE_MASK"] == 0x1C
+    assert output.exists()
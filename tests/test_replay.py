@@ -0,0 +1,89 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from replay import (Archive, ReplayMiss, record_message, recording, replay_message,
+                    replaying, request_key, write_archive)
+
+MODEL = "claude-sonnet-4-20250514"
+
+def message(text):
+    return SimpleNamespace(
+        id=f"msg-{text}", model=MODEL, stop_reason="end_turn",
+        content=[SimpleNamespace(type="text", text=text)],
+        usage=SimpleNamespace(input_tokens=10, output_tokens=len(text)))
+
+def test_archive_round_trip_with_colliding_slots(tmp_path):
+    # Keys sharing their low 8 bytes land in the same slot and must be probed
+    records = {bytes([0] * 8 + [i] * 24): json.dumps({"i": i}).encode() for i in range(20)}
+    records[b"\xff" * 32] = b'{"i": "last"}'
+    path = tmp_path / "a.gtr"
+    write_archive(str(path), records)
+
+    archive = Archive(str(path))
+    try:
+        for key, record in records.items():
+            assert archive.get(key) == json.loads(record)
+        assert archive.get(bytes([0] * 8 + [99] * 24)) is None
+        assert archive.raw_records() == records
+    finally:
+        archive.close()
+
+def test_empty_archive(tmp_path):
+    write_archive(str(tmp_path / "a.gtr"), {})
+    archive = Archive(str(tmp_path / "a.gtr"))
+    try:
+        assert archive.get(b"\0" * 32) is None
+    finally:
+        archive.close()
+
+def test_not_an_archive(tmp_path):
+    path = tmp_path / "a.gtr"
+    path.write_bytes(b"x" * 64)
+    with pytest.raises(ValueError):
+        Archive(str(path))
+
+def test_record_then_replay(tmp_path):
+    path = str(tmp_path / "a.gtr")
+    with recording(path):
+        for i in range(50):
+            record_message(f"prompt {i}", MODEL, 4096, message(f"code {i}"))
+
+    with replaying(path):
+        replayed = replay_message("prompt 7", MODEL, 4096)
+        assert replayed.content[0].text == "code 7"
+        assert replayed.usage.output_tokens == len("code 7")
+        assert replayed.stop_reason == "end_turn"
+        with pytest.raises(ReplayMiss):
+            replay_message("prompt 50", MODEL, 4096)
+    assert replay_message("prompt 7", MODEL, 4096) is None  # replay mode ended
+
+@pytest.mark.parametrize("model, max_tokens", [
+    ("claude-3-5-haiku-20241022", 4096),
+    (MODEL, 2048),
+])
+def test_replay_requires_same_model_and_max_tokens(tmp_path, model, max_tokens):
+    path = str(tmp_path / "a.gtr")
+    with recording(path):
+        record_message("prompt", MODEL, 4096, message("code"))
+    with replaying(path), pytest.raises(ReplayMiss):
+        replay_message("prompt", model, max_tokens)
+
+def test_recording_merges_with_existing_archive(tmp_path):
+    path = str(tmp_path / "a.gtr")
+    with recording(path):
+        record_message("old", MODEL, 4096, message("old code"))
+        record_message("both", MODEL, 4096, message("first"))
+    with recording(path):
+        record_message("new", MODEL, 4096, message("new code"))
+        record_message("both", MODEL, 4096, message("second"))
+
+    with replaying(path):
+        assert replay_message("old", MODEL, 4096).content[0].text == "old code"
+        assert replay_message("new", MODEL, 4096).content[0].text == "new code"
+        assert replay_message("both", MODEL, 4096).content[0].text == "second"
+
+def test_request_key_separates_fields():
+    assert request_key("a", MODEL, 1) != request_key("a", MODEL, 2)
+    assert request_key("a", MODEL, 1) != request_key("a", "other", 1)
@@ -0,0 +1,103 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import server
+from server import GenerationService, make_server, remote_generate, remote_stats
+
+SPEC = "Function: add(a: int, b: int) -> int"
+VALID = "def test_add():\n    assert True\n"
+
+class StubAPI:
+    """Stand-in for create_message that blocks until released."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+            text = self.responses[min(self.calls, len(self.responses)) - 1]
+        self.started.set()
+        self.release.wait(timeout=5)
+        return SimpleNamespace(content=[SimpleNamespace(text=text)])
+
+@pytest.fixture
+def stub_api(monkeypatch):
+    def install(*responses):
+        stub = StubAPI(responses or [VALID])
+        monkeypatch.setattr(server, "create_message", stub)
+        return stub
+    return install
+
+def run_concurrently(service, count):
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(service.generate(SPEC)))
+               for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+def test_concurrent_identical_requests_make_one_upstream_call(stub_api):
+    stub = stub_api()
+    service = GenerationService()
+    threads, results = run_concurrently(service, 5)
+    assert stub.started.wait(timeout=5)
+    # Let every caller reach the service before the upstream call returns
+    while service.stats["requests"] < 5:
+        threading.Event().wait(0.01)
+    stub.release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert stub.calls == 1
+    assert results == [VALID] * 5
+    assert service.stats["upstream_calls"] == 1
+    assert service.stats["coalesced"] == 4
+
+def test_valid_response_is_cached(stub_api):
+    stub = stub_api()
+    stub.release.set()
+    service = GenerationService()
+    assert service.generate(SPEC) == VALID
+    assert service.generate(SPEC) == VALID
+    assert stub.calls == 1
+    assert service.stats["cache_hits"] == 1
+
+def test_invalid_response_is_not_cached(stub_api):
+    stub = stub_api("def broken(:\n", VALID)
+    stub.release.set()
+    service = GenerationService()
+    assert service.generate(SPEC) == "def broken(:\n"
+    assert service.generate(SPEC) == VALID
+    assert stub.calls == 2
+    assert service.stats["cache_hits"] == 0
+
+def test_http_clients_are_coalesced(stub_api):
+    stub = stub_api()
+    httpd = make_server("http://127.0.0.1:0")
+    address = f"http://127.0.0.1:{httpd.server_address[1]}"
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        results = []
+        clients = [threading.Thread(target=lambda: results.append(remote_generate(address, SPEC)))
+                   for _ in range(3)]
+        for client in clients:
+            client.start()
+        assert stub.started.wait(timeout=5)
+        while remote_stats(address)["requests"] < 3:
+            threading.Event().wait(0.01)
+        stub.release.set()
+        for client in clients:
+            client.join(timeout=5)
+
+        assert results == [VALID] * 3
+        assert stub.calls == 1
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
@@ -0,0 +1,141 @@
+from types import SimpleNamespace
+
+import pytest
+
+import splice
+from splice import affected_tests, diff_specs, save_snapshot, splice_tests, update_tests, _unit_items
+
+OLD_SPEC = """register:
+  name: R
+  address: 16
+  fields:
+  - name: ENABLE
+    bits: [0]
+  - name: MODE
+    bits: [3, 1]
+  - name: STATUS
+    bits: [4]
+"""
+
+NEW_SPEC = """register:
+  name: R
+  address: 16
+  fields:
+  - name: MODE
+    bits: [5, 1]
+  - name: STATUS
+    bits: [4]
+"""
+
+OLD_CODE = '''import pytest
+from register_constants import R_ADDR
+
+def test_enable_reset():
+    assert read_register(R_ADDR) == 0
+
+
+@pytest.mark.parametrize("value", [0, 1])
+def test_mode_write(value):
+    write_register(R_ADDR, value)
+
+def test_status_read():
+    # odd   spacing is kept
+    assert read_register(R_ADDR)  ==  0
+
+
+class TestFields:
+    def test_enable_toggle(self):
+        assert True
+
+    def test_status_is_read_only(self):
+        assert True
+'''
+
+NEW_CODE = '''import pytest
+from register_constants import R_ADDR, R_MODE_MASK
+
+@pytest.mark.parametrize("value", [0, 1, 2])
+def test_mode_write(value):
+    write_register(R_ADDR, value & R_MODE_MASK)
+
+class TestFields:
+    def test_mode_fields(self):
+        assert R_MODE_MASK
+'''
+
+SPLICED = '''import pytest
+from register_constants import R_ADDR
+from register_constants import R_MODE_MASK
+
+@pytest.mark.parametrize("value", [0, 1, 2])
+def test_mode_write(value):
+    write_register(R_ADDR, value & R_MODE_MASK)
+
+def test_status_read():
+    # odd   spacing is kept
+    assert read_register(R_ADDR)  ==  0
+
+
+class TestFields:
+    def test_status_is_read_only(self):
+        assert True
+
+    def test_mode_fields(self):
+        assert R_MODE_MASK
+'''
+
+def test_diff_specs_by_field():
+    assert diff_specs(OLD_SPEC, NEW_SPEC) == {
+        "kind": "register", "changed": ["MODE"], "removed": ["ENABLE"],
+        "all": ["MODE", "STATUS", "ENABLE"]}
+
+@pytest.mark.parametrize("old, new", [
+    (OLD_SPEC, OLD_SPEC.replace("address: 16", "address: 32")),
+    (OLD_SPEC + "notes: x\n", OLD_SPEC + "notes: y\n"),
+    (OLD_SPEC, OLD_SPEC + "notes: x\n"),
+])
+def test_diff_specs_outside_fields_needs_full_regeneration(old, new):
+    assert diff_specs(old, new) is None
+
+def test_affected_tests_cover_methods_and_decorated_tests():
+    diff = diff_specs(OLD_SPEC, NEW_SPEC)
+    assert affected_tests(OLD_CODE, diff) == {
+        "test_enable_reset", "test_mode_write", "TestFields.test_enable_toggle"}
+
+def test_splice_replaces_only_affected_tests():
+    diff = diff_specs(OLD_SPEC, NEW_SPEC)
+    assert splice_tests(OLD_CODE, NEW_CODE, affected_tests(OLD_CODE, diff)) == SPLICED
+
+def test_splice_without_affected_tests_is_byte_identical():
+    assert splice_tests(OLD_CODE, "", set()) == OLD_CODE
+
+@pytest.mark.parametrize("test_name, expected", [
+    ("test_write_then_read_roundtrip", {"write_then_read"}),
+    ("test_write_read", {"write", "read"}),
+    ("test_rewrite", set()),
+])
+def test_unit_items_prefers_longest_name(test_name, expected):
+    assert _unit_items(test_name, ["write", "read", "write_then_read"]) == expected
+
+@pytest.fixture
+def stub_api(monkeypatch):
+    prompts = []
+    def create_message(prompt, *args, **kwargs):
+        prompts.append(prompt)
+        return SimpleNamespace(content=[SimpleNamespace(text=NEW_CODE)])
+    monkeypatch.setattr(splice, "create_message", create_message)
+    return prompts
+
+def test_update_tests_splices_changed_fields(tmp_path, stub_api):
+    output = tmp_path / "test_r.py"
+    output.write_text(OLD_CODE)
+    save_snapshot(OLD_SPEC, str(output))
+    assert update_tests(NEW_SPEC, "register", str(output)) == ("spliced", SPLICED)
+    assert "name: MODE" in stub_api[0] and "name: STATUS" not in stub_api[0]
+
+def test_update_tests_sibling_key_change_is_full(tmp_path, stub_api):
+    output = tmp_path / "test_r.py"
+    output.write_text(OLD_CODE)
+    save_snapshot(OLD_SPEC + "notes: x\n", str(output))
+    assert update_tests(OLD_SPEC + "notes: y\n", "register", str(output)) == ("full", None)
+    assert stub_api == []
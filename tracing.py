@@ -0,0 +1,138 @@
+# tracing.py
+"""
+Span-based tracing and opt-in profiling for the generation pipeline.
+
+Spans are recorded as Chrome trace events ("X" complete events, one track
+per thread) and written to a JSON file that chrome://tracing and Perfetto
+(https://ui.perfetto.dev) open directly. Nested spans nest by time on the
+same thread track. Tracing is off unless started, and span() is then a
+cheap no-op.
+
+profiling() captures a cProfile profile of the calling thread and
+tracemalloc snapshots for the run.
+"""
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Optional
+
+_tracer = None
+
+class Tracer:
+    """Collects spans in memory and writes them as a Chrome trace."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pid = os.getpid()
+        self._origin = time.perf_counter_ns()
+        self._events = []
+        self._threads = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start_ns: int, end_ns: int, args: dict) -> None:
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "cat": name.split(".")[0],
+            "ph": "X",
+            "ts": (start_ns - self._origin) / 1000,
+            "dur": (end_ns - start_ns) / 1000,
+            "pid": self.pid,
+            "tid": thread.ident,
+            "args": {key: str(value) for key, value in args.items()},
+        }
+        with self._lock:
+            self._events.append(event)
+            self._threads[thread.ident] = thread.name
+
+    def write(self) -> None:
+        with self._lock:
+            metadata = [{"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid,
+                         "args": {"name": name}} for tid, name in self._threads.items()]
+            events = metadata + sorted(self._events, key=lambda e: e["ts"])
+        with open(self.path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+@contextmanager
+def span(name: str, **args):
+    """Record the enclosed block as a span when tracing is active."""
+    tracer = _tracer
+    if tracer is None:
+        yield
+        return
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        tracer.add(name, start, time.perf_counter_ns(), args)
+
+def traced(name: str):
+    """Decorator recording every call of a function as a span."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextmanager
+def tracing(path: Optional[str]):
+    """Trace the enclosed block to path; does nothing if path is None."""
+    global _tracer
+    if path is None:
+        yield
+        return
+    _tracer = Tracer(path)
+    try:
+        with span("run", argv=" ".join(sys.argv[1:])):
+            yield
+    finally:
+        tracer, _tracer = _tracer, None
+        tracer.write()
+        print(f"Trace: {path}", file=sys.stderr)
+
+@contextmanager
+def profiling(prefix: Optional[str], top: int = 10):
+    """
+    Profile the enclosed block; does nothing if prefix is None.
+
+    Writes <prefix>.prof (cProfile, for pstats/snakeviz) and
+    <prefix>.start.tracemalloc / <prefix>.end.tracemalloc snapshots (load
+    with tracemalloc.Snapshot.load), and prints the peak traced memory and
+    the top allocation growth. cProfile only sees the calling thread; use
+    the trace for work done in worker threads.
+    """
+    if prefix is None:
+        yield
+        return
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start(25)
+    start_snapshot = tracemalloc.take_snapshot()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        end_snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if started_tracemalloc:
+            tracemalloc.stop()
+
+        profiler.dump_stats(f"{prefix}.prof")
+        start_snapshot.dump(f"{prefix}.start.tracemalloc")
+        end_snapshot.dump(f"{prefix}.end.tracemalloc")
+        print(f"Profile: {prefix}.prof, {prefix}.{{start,end}}.tracemalloc "
+              f"(peak traced memory {peak / 1024:.0f} KiB)", file=sys.stderr)
+        for stat in end_snapshot.compare_to(start_snapshot, "lineno")[:top]:
+            print(f"  {stat}", file=sys.stderr)
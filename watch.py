@@ -0,0 +1,142 @@
+# watch.py
+"""
+Watch spec directories and regenerate tests for specs that changed.
+
+Bursts of saves are debounced. A spec is regenerated only when the
+normalized form from load_spec changes, so whitespace- or comment-only edits
+to YAML specs are ignored. A newer save cancels a queued generation for the
+same spec, and the result of one already running is discarded when it
+finishes. Failed generations are logged, and the spec is retried on its
+next save even if the content is the same.
+"""
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+from Generate_Tests import load_spec
+
+SPEC_SUFFIXES = {".yaml", ".yml", ".txt", ".spec"}
+
+def scan_specs(dirs: list[str]) -> dict[str, float]:
+    """Return {spec path: mtime} for every spec file under dirs."""
+    found = {}
+    for directory in dirs:
+        for path in Path(directory).rglob("*"):
+            if path.suffix in SPEC_SUFFIXES and path.is_file():
+                try:
+                    found[str(path)] = path.stat().st_mtime_ns
+                except FileNotFoundError:
+                    pass  # deleted between listing and stat
+    return found
+
+class SpecWatcher:
+    """
+    Poll spec directories and dispatch debounced regenerations.
+
+    Args:
+        dirs: Directories to watch (recursively)
+        regenerate: Called as regenerate(spec_path, spec_content, template_type,
+            is_current) in a worker thread; is_current() turns False once a
+            newer save has made the generation stale. Returns True once the
+            outputs are saved; anything else (or an exception, which is
+            logged) leaves the spec to be retried on its next save
+        debounce: Seconds a spec must be quiet before it is regenerated
+        interval: Polling interval in seconds
+        workers: Maximum concurrent generations
+    """
+
+    def __init__(self, dirs: list[str], regenerate: Callable, debounce: float = 0.5,
+                 interval: float = 0.2, workers: int = 4):
+        self.dirs = dirs
+        self.regenerate = regenerate
+        self.debounce = debounce
+        self.interval = interval
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._mtimes = scan_specs(dirs)
+        # Normalized spec last saved successfully, and last dispatched
+        self._normalized = {path: self._load(path) for path in self._mtimes}
+        self._requested = dict(self._normalized)
+        self._pending = {}   # spec path -> time of last observed change
+        self._versions = {}  # spec path -> generation counter
+        self._futures = {}
+
+    @staticmethod
+    def _load(path: str):
+        try:
+            return load_spec(path)
+        except Exception:
+            return None  # half-written or invalid; retried on the next save
+
+    def poll(self) -> None:
+        """Check for changes once and dispatch specs that have settled."""
+        now = time.monotonic()
+        current = scan_specs(self.dirs)
+        for path, mtime in current.items():
+            if self._mtimes.get(path) != mtime:
+                self._pending[path] = now
+        for path in set(self._mtimes) - set(current):
+            self._pending.pop(path, None)
+            with self._lock:
+                self._normalized.pop(path, None)
+            self._requested.pop(path, None)
+        self._mtimes = current
+
+        for path, changed_at in list(self._pending.items()):
+            if now - changed_at < self.debounce:
+                continue
+            del self._pending[path]
+            loaded = self._load(path)
+            if loaded is None or self._up_to_date(path, loaded):
+                continue
+            self._requested[path] = loaded
+            self._dispatch(path, *loaded)
+
+    def _up_to_date(self, path: str, loaded: tuple) -> bool:
+        """True if loaded is already saved, or is being generated right now."""
+        if loaded != self._requested.get(path):
+            return False
+        future = self._futures.get(path)
+        with self._lock:
+            saved = loaded == self._normalized.get(path)
+        return saved or (future is not None and not future.done())
+
+    def _dispatch(self, path: str, spec_content: str, template_type: str) -> None:
+        with self._lock:
+            version = self._versions.get(path, 0) + 1
+            self._versions[path] = version
+            previous = self._futures.get(path)
+        if previous is not None:
+            previous.cancel()
+
+        def is_current() -> bool:
+            with self._lock:
+                return self._versions[path] == version
+
+        def finished(future) -> None:
+            if future.cancelled():
+                return
+            error = future.exception()
+            if error is not None:
+                print(f"Failed: {path}", file=sys.stderr)
+                traceback.print_exception(type(error), error, error.__traceback__)
+                return
+            with self._lock:
+                if future.result() is True and self._versions[path] == version:
+                    self._normalized[path] = (spec_content, template_type)
+
+        future = self._executor.submit(self.regenerate, path, spec_content, template_type, is_current)
+        future.add_done_callback(finished)
+        self._futures[path] = future
+
+    def run(self) -> None:
+        """Poll until interrupted."""
+        try:
+            while True:
+                self.poll()
+                time.sleep(self.interval)
+        finally:
+            self._executor.shutdown(wait=False, cancel_futures=True)